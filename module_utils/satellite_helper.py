@@ -0,0 +1,84 @@
+# satellite_helper.py
+
+import json
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+from ansible.module_utils.urls import open_url
+
+# Number of IP addresses OR-ed together in a single host search, which keeps the query string short.
+CLAIM_SEARCH_BATCH = 100
+
+
+class SatelliteApi:
+    """
+    Minimal client for the Satellite (Foreman) REST API using basic authentication.
+    """
+    def __init__(self, fqdn, user, pwd, validate_certs=False):
+        self.fqdn = fqdn
+        self.user = user
+        self.pwd = pwd
+        self.validate_certs = validate_certs
+
+    def get(self, endpoint, query=None):
+        """
+        Run a GET against an API endpoint and return the decoded body.
+        """
+        url = f"https://{self.fqdn}{endpoint}"
+        if query:
+            url = f"{url}?{urlencode(query)}"
+        response = open_url(
+            url,
+            method='GET',
+            url_username=self.user,
+            url_password=self.pwd,
+            force_basic_auth=True,
+            validate_certs=self.validate_certs,
+            headers={'Accept': 'application/json'},
+        )
+        return json.loads(response.read())
+
+    def get_all(self, endpoint, query=None, per_page=500):
+        """
+        Return the results of every page of an index endpoint.
+        """
+        query = dict(query or {}, per_page=per_page)
+        results = []
+        page = 1
+        while True:
+            data = self.get(endpoint, dict(query, page=page))
+            results.extend(data['results'])
+            if not data['results'] or len(results) >= data['subtotal']:
+                return results
+            page += 1
+
+    def get_ip_claims(self, ip_list):
+        """
+        Return a dictionary mapping each IP address in the list that is already assigned to a
+        Satellite host to that host's name. Addresses are looked up with one OR-ed search per batch.
+        """
+        wanted = set(ip_list)
+        claims = {}
+        ip_list = sorted(wanted)
+        for i in range(0, len(ip_list), CLAIM_SEARCH_BATCH):
+            batch = ip_list[i:i + CLAIM_SEARCH_BATCH]
+            search = ' or '.join(f"ip={ip}" for ip in batch)
+            for host in self.get_all('/api/v2/hosts', {'search': search}, per_page=len(batch)):
+                if host.get('ip') in wanted:
+                    claims.setdefault(host['ip'], host['name'])
+        return claims
+
+    def get_subnet(self, network_address):
+        """
+        Return the Satellite subnet record for a "<network>/<cidr>" address, or None.
+        """
+        network, cidr = network_address.split('/')
+        for subnet in self.get_all('/api/v2/subnets', {'search': f"network = {network}"}):
+            if str(subnet['cidr']) == cidr:
+                return subnet
+        return None
+
+    def get_subnet_claims(self, subnet):
+        """
+        Return the IP addresses of the Satellite hosts in a subnet record.
+        """
+        hosts = self.get_all('/api/v2/hosts', {'search': f"subnet = {subnet['network']}"})
+        return [host['ip'] for host in hosts if host.get('ip')]
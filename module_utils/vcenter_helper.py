@@ -1,30 +1,353 @@
 # vcenter_helper.py
 
 import atexit
+import contextlib
+import fcntl
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import ssl
+import tempfile
+import time
 from pyVim import connect
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
+
+# Directory holding cached vCenter session cookies, one file per host/user.
+DEFAULT_SESSION_CACHE_DIR = os.environ.get(
+    'VM_FACTS_SESSION_DIR', os.path.expanduser('~/.cache/vm_facts/sessions')
+)
+
+# SQLite file backing the local inventory cache shared by the get_* modules.
+DEFAULT_CACHE_PATH = os.environ.get(
+    'VM_FACTS_CACHE', os.path.expanduser('~/.cache/vm_facts/inventory.db')
+)
+
+# Seconds a cached object type stays fresh before it is fetched from vCenter again.
+# Capacity figures move faster than the topology, so storage expires first.
+DEFAULT_CACHE_TTLS = {
+    'Datacenter': 86400,
+    'Folder': 3600,
+    'ClusterComputeResource': 3600,
+    'HostSystem': 3600,
+    'Network': 3600,
+    'StoragePod': 300,
+    'Datastore': 300,
+    'VirtualMachine': 900,
+}
+
+# Options every vCenter get_* module accepts to control the inventory cache.
+CACHE_ARGUMENT_SPEC = dict(
+    cache_path=dict(type='path', default=DEFAULT_CACHE_PATH),
+    ttl=dict(type='int', required=False),
+    force=dict(type='bool', default=False),
+)
+
+# Object types kept in the name index used for lookups when no snapshot is in use.
+INDEX_TYPES = ['Datacenter', 'Folder', 'ClusterComputeResource', 'StoragePod']
+
+# Number of objects returned per RetrievePropertiesEx page.
+RETRIEVE_PAGE_SIZE = 1000
+
+# Properties pulled for each managed object type by VcenterFacts.snapshot().
+# StoragePod is listed before Folder because it is a Folder subclass, and the
+# first matching entry decides the type an object is recorded under.
+SNAPSHOT_PROPERTIES = [
+    ('Datacenter', vim.Datacenter, ['name', 'parent', 'vmFolder', 'hostFolder', 'datastoreFolder']),
+    ('ClusterComputeResource', vim.ClusterComputeResource,
+     ['name', 'parent', 'summary.totalMemory', 'summary.numCpuCores', 'network', 'host', 'datastore']),
+    ('HostSystem', vim.HostSystem, ['name', 'parent', 'datastore']),
+    ('StoragePod', vim.StoragePod, ['name', 'parent', 'summary.freeSpace', 'summary.capacity', 'childEntity']),
+    ('Folder', vim.Folder, ['name', 'parent']),
+    ('Datastore', vim.Datastore, ['name', 'parent', 'summary.freeSpace', 'summary.capacity']),
+    ('Network', vim.Network, ['name']),
+    ('VirtualMachine', vim.VirtualMachine, ['name', 'parent', 'config.template', 'runtime.host']),
+]
+
+
+def _to_plain(value):
+    """
+    Convert a property value into something that can be stored in a snapshot record.
+    Managed object references become their MoRef IDs.
+    """
+    if isinstance(value, vmodl.ManagedObject):
+        return value._moId
+    if isinstance(value, list):
+        return [_to_plain(item) for item in value]
+    return value
+
+
+def cache_options(params):
+    """
+    Return the VcenterFacts cache keyword arguments for the CACHE_ARGUMENT_SPEC module options.
+    An empty cache_path disables the cache, and ttl replaces the TTL of every object type.
+    """
+    ttls = None
+    if params.get('ttl') is not None:
+        ttls = {type_name: params['ttl'] for type_name in DEFAULT_CACHE_TTLS}
+    return dict(cache_path=params.get('cache_path') or None, cache_ttls=ttls)
+
+
+class InventorySnapshot:
+    """
+    In-memory copy of the vCenter inventory properties used by VcenterFacts.
+    Records are plain dictionaries keyed by MoRef ID, with references to other
+    objects stored as MoRef IDs.
+    """
+    def __init__(self):
+        self.records = {}
+        self.by_type = {type_name: {} for type_name, _, _ in SNAPSHOT_PROPERTIES}
+        self.by_name = {type_name: {} for type_name, _, _ in SNAPSHOT_PROPERTIES}
+        self.loaded = set()
+
+    def add(self, moid, type_name, props):
+        """
+        Add or replace the record for a managed object.
+        """
+        record = {key: _to_plain(value) for key, value in props.items()}
+        record['_moid'] = moid
+        record['_type'] = type_name
+        self._insert(record)
+        return record
+
+    def load(self, type_name, records):
+        """
+        Replace all records of a type with already converted records,
+        e.g. ones read back from the inventory cache.
+        """
+        self.drop(type_name)
+        for record in records:
+            self._insert(record)
+        self.loaded.add(type_name)
+
+    def drop(self, type_name):
+        """
+        Forget all records of a type.
+        """
+        for moid in self.by_type[type_name]:
+            self.records.pop(moid, None)
+        self.by_type[type_name] = {}
+        self.by_name[type_name] = {}
+        self.loaded.discard(type_name)
+
+    def remove(self, moid):
+        """
+        Forget the record for a managed object.
+        """
+        record = self.records.pop(moid, None)
+        if record is None:
+            return
+        type_name = record['_type']
+        self.by_type[type_name].pop(moid, None)
+        same_name = self.by_name[type_name].get(record.get('name'), [])
+        if moid in same_name:
+            same_name.remove(moid)
+
+    def _insert(self, record):
+        """
+        Store a record and index it by type and name.
+        """
+        moid = record['_moid']
+        self.remove(moid)
+        self.records[moid] = record
+        self.by_type[record['_type']][moid] = record
+        self.by_name[record['_type']].setdefault(record.get('name'), []).append(moid)
+
+    def of_type(self, type_name):
+        """
+        Return all records of the given type.
+        """
+        return list(self.by_type[type_name].values())
+
+    def find(self, type_name, name, datacenter=None):
+        """
+        Return the first record of the given type with a matching name, optionally
+        restricted to a datacenter record.
+        """
+        for moid in self.by_name[type_name].get(name, []):
+            if datacenter and self.datacenter_of(moid) is not datacenter:
+                continue
+            return self.records[moid]
+        return None
+
+    def datacenter_of(self, moid):
+        """
+        Walk the parent chain of a managed object and return its datacenter record.
+        """
+        record = self.records.get(moid)
+        while record is not None:
+            if record['_type'] == 'Datacenter':
+                return record
+            record = self.records.get(record.get('parent'))
+        return None
+
+
+class InventoryCache:
+    """
+    SQLite-backed store of snapshot records, one row per vCenter account (user@host) and object type,
+    with a time-to-live per object type.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttls=None):
+        self.path = path
+        self.ttls = dict(DEFAULT_CACHE_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS inventory ("
+                " vcenter TEXT NOT NULL,"
+                " object_type TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " records TEXT NOT NULL,"
+                " PRIMARY KEY (vcenter, object_type))"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                " vcenter TEXT PRIMARY KEY,"
+                " collector TEXT NOT NULL,"
+                " version TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        """
+        Open the cache database. Several modules may run at once, so wait on locks.
+        """
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def get(self, vcenter, object_type, check_ttl=True):
+        """
+        Return the cached records for an object type, or None if missing or expired.
+        """
+        db = self._connect()
+        try:
+            row = db.execute(
+                "SELECT fetched_at, records FROM inventory WHERE vcenter = ? AND object_type = ?",
+                (vcenter, object_type),
+            ).fetchone()
+        finally:
+            db.close()
+
+        if row is None:
+            return None
+        fetched_at, records = row
+        if check_ttl and time.time() - fetched_at > self.ttls.get(object_type, 0):
+            return None
+        return json.loads(records)
+
+    def put(self, vcenter, object_type, records):
+        """
+        Store the records for an object type.
+        """
+        db = self._connect()
+        try:
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO inventory (vcenter, object_type, fetched_at, records)"
+                    " VALUES (?, ?, ?, ?)",
+                    (vcenter, object_type, time.time(), json.dumps(records)),
+                )
+        finally:
+            db.close()
+
+    def invalidate(self, vcenter, object_types=None):
+        """
+        Drop cached records for the given object types, or for all types if None.
+        The sync state is dropped as well, since deltas can no longer be applied
+        on top of the remaining records.
+        """
+        db = self._connect()
+        try:
+            with db:
+                if object_types is None:
+                    db.execute("DELETE FROM inventory WHERE vcenter = ?", (vcenter,))
+                else:
+                    db.executemany(
+                        "DELETE FROM inventory WHERE vcenter = ? AND object_type = ?",
+                        [(vcenter, object_type) for object_type in object_types],
+                    )
+                db.execute("DELETE FROM sync_state WHERE vcenter = ?", (vcenter,))
+        finally:
+            db.close()
+
+    def get_sync_state(self, vcenter):
+        """
+        Return the (collector MoRef ID, version token) of the last sync, or None.
+        """
+        db = self._connect()
+        try:
+            return db.execute(
+                "SELECT collector, version FROM sync_state WHERE vcenter = ?", (vcenter,)
+            ).fetchone()
+        finally:
+            db.close()
+
+    def put_sync_state(self, vcenter, collector, version):
+        """
+        Store the collector and version token to resume the next sync from.
+        """
+        db = self._connect()
+        try:
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO sync_state (vcenter, collector, version) VALUES (?, ?, ?)",
+                    (vcenter, collector, version),
+                )
+        finally:
+            db.close()
 
 class VcenterConnection:
-    def __init__(self, host, user, pwd, disable_ssl_verification=False):
+    def __init__(self, host, user, pwd, disable_ssl_verification=False,
+                 session_cache_dir=DEFAULT_SESSION_CACHE_DIR):
         self.host = host
         self.user = user
         self.pwd = pwd
         self.disable_ssl_verification = disable_ssl_verification
+        self.session_cache_dir = session_cache_dir
         self.si = None
 
     def connect(self):
         """
         Connect to vCenter.
+        A cached session cookie is reused when it is still valid and was saved with the
+        same password, otherwise a fresh login is done and its cookie is cached for the next run.
+        Raises vim.fault.InvalidLogin when vCenter rejects the credentials.
         """
         try:
-            if self.disable_ssl_verification:
-                service_instance = connect.SmartConnectNoSSL(host=self.host, user=self.user, pwd=self.pwd)
-            else:
-                service_instance = connect.SmartConnect(host=self.host, user=self.user, pwd=self.pwd)
+            with self._session_lock():
+                cached = self._load_session()
+                replaced = None
+                if cached and self._password_matches(cached):
+                    service_instance = self._resume_session(cached)
+                    if service_instance:
+                        self.si = service_instance
+                        return service_instance
+                elif cached:
+                    # Saved with another password; only a fresh login proves this one.
+                    replaced = cached
 
-            atexit.register(connect.Disconnect, service_instance)
-            self.si = service_instance
-            return service_instance
+                if self.disable_ssl_verification:
+                    service_instance = connect.SmartConnectNoSSL(host=self.host, user=self.user, pwd=self.pwd)
+                else:
+                    service_instance = connect.SmartConnect(host=self.host, user=self.user, pwd=self.pwd)
+
+                # A cached session has to outlive this process, so only log out on
+                # exit when the cookie can't be saved for reuse.
+                if self._save_session(service_instance):
+                    if replaced:
+                        self._logout_cookie(replaced['cookie'])
+                else:
+                    atexit.register(connect.Disconnect, service_instance)
+                self.si = service_instance
+                return service_instance
+        except vim.fault.InvalidLogin:
+            raise
         except Exception as e:
             raise ConnectionError(f"Unable to connect to vCenter: {e}")
 
@@ -36,11 +359,503 @@ class VcenterConnection:
             connect.Disconnect(self.si)
         except Exception as e:
             raise ConnectionError(f"Unable to disconnect from vCenter: {e}")
+        finally:
+            self._forget_session()
+
+    def _session_file(self):
+        """
+        Return the path of the session cookie file for this host and user.
+        """
+        key = hashlib.sha256(f"{self.host}\0{self.user}".encode()).hexdigest()
+        return os.path.join(self.session_cache_dir, f"{key}.json")
+
+    @contextlib.contextmanager
+    def _session_lock(self):
+        """
+        Hold an exclusive lock on the session cookie of this host and user, so that
+        concurrent runs log in one at a time and the later ones reuse the saved cookie
+        instead of each replacing it with a session of their own.
+        """
+        lock_file = None
+        if self.session_cache_dir:
+            try:
+                os.makedirs(self.session_cache_dir, mode=0o700, exist_ok=True)
+                lock_file = open(f"{self._session_file()}.lock", 'a')
+            except OSError:
+                # An unusable cache directory only costs the session reuse.
+                lock_file = None
+
+        if lock_file is None:
+            yield
+            return
+
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _password_verifier(self, salt):
+        """
+        Return a salted hash of the password, saved with the cookie so that a resumed
+        session still requires the right password.
+        """
+        return hashlib.pbkdf2_hmac('sha256', self.pwd.encode(), bytes.fromhex(salt), 100000).hex()
+
+    def _password_matches(self, cached):
+        """
+        Return True when the cached session was saved after a login with this password.
+        """
+        try:
+            verifier = self._password_verifier(cached['salt'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        return hmac.compare_digest(verifier, str(cached.get('verifier', '')))
+
+    def _load_session(self):
+        """
+        Return the cached session of this host and user, or None.
+        """
+        if not self.session_cache_dir:
+            return None
+
+        try:
+            with open(self._session_file(), 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(cached, dict) or 'cookie' not in cached:
+            return None
+        if cached.get('host') != self.host or cached.get('user') != self.user:
+            return None
+        return cached
+
+    def _cookie_instance(self, cookie):
+        """
+        Build a service instance that talks to vCenter with the given session cookie.
+        """
+        ssl_context = ssl._create_unverified_context() if self.disable_ssl_verification else None
+        stub = connect.SmartStubAdapter(host=self.host, sslContext=ssl_context)
+        stub.cookie = cookie
+        return vim.ServiceInstance('ServiceInstance', stub)
+
+    def _resume_session(self, cached):
+        """
+        Rebuild a service instance from a cached session cookie.
+        Returns None when vCenter no longer accepts the session. Any other error, such as
+        vCenter being unreachable, is raised and leaves the cached cookie in place.
+        """
+        service_instance = self._cookie_instance(cached['cookie'])
+        try:
+            # currentSession is a single cheap call and is unset once the
+            # session has expired or been terminated.
+            if service_instance.content.sessionManager.currentSession is not None:
+                return service_instance
+        except vim.fault.NotAuthenticated:
+            pass
+        self._forget_session()
+        return None
+
+    def _logout_cookie(self, cookie):
+        """
+        Log out the session behind a cookie that is no longer cached, so it doesn't
+        linger on vCenter until it times out.
+        """
+        try:
+            self._cookie_instance(cookie).content.sessionManager.Logout()
+        except Exception:
+            # Already expired or logged out.
+            pass
+
+    def _save_session(self, service_instance):
+        """
+        Write the session cookie to the cache, readable by the owner only.
+        Returns True when the session was cached.
+        """
+        if not self.session_cache_dir:
+            return False
+
+        try:
+            os.makedirs(self.session_cache_dir, mode=0o700, exist_ok=True)
+            salt = os.urandom(16).hex()
+            fd, tmp_path = tempfile.mkstemp(dir=self.session_cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({
+                    'host': self.host,
+                    'user': self.user,
+                    'cookie': service_instance._stub.cookie,
+                    'salt': salt,
+                    'verifier': self._password_verifier(salt),
+                }, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self._session_file())
+            return True
+        except OSError:
+            return False
+
+    def _forget_session(self):
+        """
+        Remove the cached session cookie, if any.
+        """
+        if not self.session_cache_dir:
+            return
+
+        try:
+            os.remove(self._session_file())
+        except OSError:
+            pass
 
 class VcenterFacts:
-    def __init__(self, host, user, pwd, disable_ssl_verification=False):
-        self.conn = VcenterConnection(host, user, pwd, disable_ssl_verification)
-        self.si = self.conn.connect()
+    def __init__(self, host, user, pwd, disable_ssl_verification=False,
+                 session_cache_dir=DEFAULT_SESSION_CACHE_DIR, cache_path=DEFAULT_CACHE_PATH,
+                 cache_ttls=None):
+        self.host = host
+        # Accounts can see different parts of the inventory, so cached records are kept per user
+        self.cache_key = f"{user}@{host}"
+        self.conn = VcenterConnection(host, user, pwd, disable_ssl_verification, session_cache_dir)
+        self.cache = None
+        if cache_path:
+            try:
+                self.cache = InventoryCache(cache_path, cache_ttls)
+            except (OSError, sqlite3.Error):
+                # An unusable cache location shouldn't stop live lookups.
+                self.cache = None
+        self._si = None
+        self._snapshot = None
+        self._sync_state = None
+        self._index = None
+        self._folders = None
+
+    @property
+    def si(self):
+        """
+        Service instance, connected on first use so that runs answered entirely
+        from the inventory cache never talk to vCenter.
+        """
+        if self._si is None:
+            self._si = self.conn.connect()
+        return self._si
+
+    def snapshot(self, object_types=None):
+        """
+        Load datacenters, clusters, hosts, storage pods, datastores, networks and VMs
+        into memory with bulk RetrievePropertiesEx calls.
+        Once taken, the get_* methods answer from the snapshot instead of reading
+        properties from live objects one round trip at a time.
+        Object types still fresh in the inventory cache are read from it instead.
+        """
+        if self._snapshot is None:
+            self._snapshot = InventorySnapshot()
+        if object_types is None:
+            object_types = [type_name for type_name, _, _ in SNAPSHOT_PROPERTIES]
+
+        missing = [t for t in object_types if t not in self._snapshot.loaded]
+        if self.cache:
+            for type_name in list(missing):
+                records = self.cache.get(self.cache_key, type_name)
+                if records is not None:
+                    self._snapshot.load(type_name, records)
+                    missing.remove(type_name)
+
+        if missing:
+            self._fetch_snapshot(missing)
+
+        return self._snapshot
+
+    def _fetch_snapshot(self, object_types):
+        """
+        Fetch the given object types from vCenter into the snapshot and the cache.
+        """
+        property_specs = [
+            (obj_type, paths) for type_name, obj_type, paths in SNAPSHOT_PROPERTIES
+            if type_name in object_types
+        ]
+        fetched = {type_name: [] for type_name in object_types}
+        for obj, props in self._retrieve_properties(property_specs):
+            # A view over Folder also returns StoragePods; only keep the types asked for.
+            type_name = self._snapshot_type(obj)
+            if type_name in fetched:
+                fetched[type_name].append((obj._moId, props))
+
+        for type_name, objects in fetched.items():
+            self._snapshot.drop(type_name)
+            records = [self._snapshot.add(moid, type_name, props) for moid, props in objects]
+            self._snapshot.loaded.add(type_name)
+            if self.cache:
+                self.cache.put(self.cache_key, type_name, records)
+
+    def sync(self, max_wait_seconds=0):
+        """
+        Bring the snapshot up to date with PropertyCollector versioned updates (WaitForUpdatesEx).
+        The first sync loads the whole inventory. Later syncs, including ones from a new
+        process reusing the cached vCenter session, resume from the collector and version
+        token persisted in the inventory cache and only apply the changes since then.
+        max_wait_seconds=0 returns as soon as pending changes are applied.
+        Returns the number of object updates applied.
+        """
+        collector, version = self._resume_sync()
+        try:
+            applied, version = self._wait_for_updates(collector, version, max_wait_seconds)
+        except (vmodl.fault.ManagedObjectNotFound, vmodl.query.InvalidCollectorVersion):
+            # The collector died with its session or the token is no longer valid.
+            collector, version = self._start_sync()
+            applied, version = self._wait_for_updates(collector, version, max_wait_seconds)
+
+        self._sync_state = (collector._moId, version)
+        if self.cache:
+            for type_name in self._snapshot.loaded:
+                self.cache.put(self.cache_key, type_name, self._snapshot.of_type(type_name))
+            self.cache.put_sync_state(self.cache_key, collector._moId, version)
+
+        return applied
+
+    def watch(self, max_wait_seconds=60, callback=None):
+        """
+        Keep the snapshot and the inventory cache in sync until interrupted, calling
+        callback(snapshot, applied) after every batch of changes.
+        """
+        while True:
+            applied = self.sync(max_wait_seconds)
+            if applied and callback:
+                callback(self._snapshot, applied)
+
+    def _resume_sync(self):
+        """
+        Return the (collector, version) to continue syncing from, restoring the snapshot
+        from the cache when resuming in a new process. Starts a new sync if there is none.
+        """
+        state = self._sync_state
+        if state is None and self.cache:
+            state = self.cache.get_sync_state(self.cache_key)
+            if state:
+                self._snapshot = InventorySnapshot()
+                for type_name, _, _ in SNAPSHOT_PROPERTIES:
+                    records = self.cache.get(self.cache_key, type_name, check_ttl=False)
+                    if records is None:
+                        state = None
+                        break
+                    self._snapshot.load(type_name, records)
+
+        if not state:
+            return self._start_sync()
+
+        collector_id, version = state
+        return vmodl.query.PropertyCollector(collector_id, self.si._stub), version
+
+    def _start_sync(self):
+        """
+        Create a dedicated property collector with a filter over the whole inventory.
+        The view and collector live as long as the vCenter session so later syncs can reuse them.
+        """
+        content = self.si.content
+        view = content.viewManager.CreateContainerView(
+            content.rootFolder, [obj_type for _, obj_type, _ in SNAPSHOT_PROPERTIES], True
+        )
+        property_specs = [(obj_type, paths) for _, obj_type, paths in SNAPSHOT_PROPERTIES]
+        collector = content.propertyCollector.CreatePropertyCollector()
+        collector.CreateFilter(self._view_filter_spec(view, property_specs), partialUpdates=False)
+
+        self._snapshot = InventorySnapshot()
+        return collector, ''
+
+    def _wait_for_updates(self, collector, version, max_wait_seconds):
+        """
+        Apply every update set available from the collector since version.
+        Returns the number of object updates applied and the new version token.
+        """
+        options = vmodl.query.PropertyCollector.WaitOptions(
+            maxWaitSeconds=max_wait_seconds, maxObjectUpdates=RETRIEVE_PAGE_SIZE
+        )
+        applied = 0
+        while True:
+            update_set = collector.WaitForUpdatesEx(version, options)
+            if update_set is None:
+                break
+            version = update_set.version
+            for filter_update in update_set.filterSet or []:
+                for object_update in filter_update.objectSet or []:
+                    self._apply_update(object_update)
+                    applied += 1
+            if not update_set.truncated:
+                break
+
+        for type_name, _, _ in SNAPSHOT_PROPERTIES:
+            self._snapshot.loaded.add(type_name)
+        return applied, version
+
+    def _apply_update(self, object_update):
+        """
+        Apply one ObjectUpdate (enter, modify or leave) to the snapshot.
+        """
+        moid = object_update.obj._moId
+        if object_update.kind == 'leave':
+            self._snapshot.remove(moid)
+            return
+
+        type_name = self._snapshot_type(object_update.obj)
+        if type_name is None:
+            return
+
+        props = {}
+        record = self._snapshot.records.get(moid)
+        if record is not None and object_update.kind != 'enter':
+            props = {key: value for key, value in record.items() if not key.startswith('_')}
+        for change in object_update.changeSet or []:
+            if change.op in ('remove', 'indirectRemove'):
+                props.pop(change.name, None)
+            else:
+                props[change.name] = change.val
+        self._snapshot.add(moid, type_name, props)
+
+    def _use_snapshot(self, object_types):
+        """
+        Return True if the get_* methods should answer from the snapshot, making
+        sure the object types they need are loaded.
+        The snapshot is used once snapshot() was called or whenever a cache is configured.
+        """
+        if self._snapshot is None and self.cache is None:
+            return False
+        self.snapshot(object_types)
+        return True
+
+    def invalidate_cache(self, object_types=None):
+        """
+        Drop cached and in-memory records for the given object types, or for all
+        types if None, so that the next lookup fetches them from vCenter.
+        """
+        if self.cache:
+            self.cache.invalidate(self.cache_key, object_types)
+        self._sync_state = None
+        self._index = None
+        self._folders = None
+        if self._snapshot is not None:
+            for type_name in object_types or list(self._snapshot.loaded):
+                self._snapshot.drop(type_name)
+
+    def _snapshot_type(self, obj):
+        """
+        Return the SNAPSHOT_PROPERTIES type name a managed object is recorded under.
+        """
+        for type_name, obj_type, _ in SNAPSHOT_PROPERTIES:
+            if isinstance(obj, obj_type):
+                return type_name
+        return None
+
+    def _bulk_records(self, property_specs):
+        """
+        Bulk-fetch property_specs (see _retrieve_properties) into a new InventorySnapshot.
+        Objects are recorded under their SNAPSHOT_PROPERTIES type and only kept when that
+        type was asked for, so storage pods returned for vim.Folder are left out.
+        """
+        type_names = {
+            type_name for type_name, obj_type, _ in SNAPSHOT_PROPERTIES
+            if any(spec_type is obj_type for spec_type, _ in property_specs)
+        }
+        snapshot = InventorySnapshot()
+        for obj, props in self._retrieve_properties(property_specs):
+            type_name = self._snapshot_type(obj)
+            if type_name in type_names:
+                snapshot.add(obj._moId, type_name, props)
+        snapshot.loaded.update(type_names)
+        return snapshot
+
+    def _name_index(self):
+        """
+        Return an InventorySnapshot holding only the names and parents of datacenters,
+        folders, clusters and storage pods, fetched in one bulk call and kept for the
+        lifetime of this object. Live lookups resolve names through it instead of
+        scanning childEntity lists, and it covers objects nested in subfolders.
+        """
+        if self._index is None:
+            property_specs = [
+                (obj_type, ['name', 'parent']) for type_name, obj_type, _ in SNAPSHOT_PROPERTIES
+                if type_name in INDEX_TYPES
+            ]
+            self._index = self._bulk_records(property_specs)
+
+        return self._index
+
+    def _managed_object(self, moid, snapshot=None):
+        """
+        Rebuild a managed object reference for a snapshot record without a round trip.
+        """
+        snapshot = snapshot or self._snapshot
+        type_name = snapshot.records[moid]['_type']
+        for name, obj_type, _ in SNAPSHOT_PROPERTIES:
+            if name == type_name:
+                return obj_type(moid, self.si._stub)
+
+    def _view_filter_spec(self, view, property_specs):
+        """
+        Build a FilterSpec selecting the given properties of every object in a ContainerView.
+        """
+        traversal_spec = vmodl.query.PropertyCollector.TraversalSpec(
+            name='traverseView', path='view', skip=False, type=vim.view.ContainerView
+        )
+        object_spec = vmodl.query.PropertyCollector.ObjectSpec(
+            obj=view, skip=True, selectSet=[traversal_spec]
+        )
+        prop_specs = [
+            vmodl.query.PropertyCollector.PropertySpec(type=obj_type, pathSet=paths, all=False)
+            for obj_type, paths in property_specs
+        ]
+        return vmodl.query.PropertyCollector.FilterSpec(objectSet=[object_spec], propSet=prop_specs)
+
+    def _retrieve_properties(self, property_specs, container=None):
+        """
+        Bulk-fetch properties for every object of the given types below container
+        (the root folder by default) through a ContainerView.
+        property_specs is a list of (type, [property paths]) tuples.
+        Returns a list of (managed object, {property path: value}) tuples.
+        """
+        content = self.si.content
+        if container is None:
+            container = content.rootFolder
+
+        view = content.viewManager.CreateContainerView(
+            container, [obj_type for obj_type, _ in property_specs], True
+        )
+        try:
+            return self._collect_properties(self._view_filter_spec(view, property_specs))
+        finally:
+            view.Destroy()
+
+    def _collect_properties(self, filter_spec):
+        """
+        Run RetrievePropertiesEx for a FilterSpec, following continuation tokens.
+        Returns a list of (managed object, {property path: value}) tuples.
+        """
+        options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=RETRIEVE_PAGE_SIZE)
+        collector = self.si.content.propertyCollector
+        objects = []
+        result = collector.RetrievePropertiesEx([filter_spec], options)
+        while result:
+            for obj_content in result.objects:
+                props = {prop.name: prop.val for prop in obj_content.propSet}
+                objects.append((obj_content.obj, props))
+            if not result.token:
+                break
+            result = collector.ContinueRetrievePropertiesEx(result.token)
+        return objects
+
+    def _datastore_space(self, moids):
+        """
+        Read the current free space and capacity of the given datastores in one call.
+        Placement must not use cached capacity, or every build of a wave would pick the
+        same datastore, so this always goes to vCenter.
+        Returns a dictionary mapping each datastore MoRef ID to its properties.
+        """
+        if not moids:
+            return {}
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+            objectSet=[
+                vmodl.query.PropertyCollector.ObjectSpec(obj=vim.Datastore(moid, self.si._stub))
+                for moid in moids
+            ],
+            propSet=[vmodl.query.PropertyCollector.PropertySpec(
+                type=vim.Datastore, pathSet=['summary.freeSpace', 'summary.capacity'], all=False
+            )],
+        )
+        return {obj._moId: props for obj, props in self._collect_properties(filter_spec)}
 
     def get_root(self):
         """
@@ -55,28 +870,58 @@ class VcenterFacts:
         Retrieve a list of datacenter objects in the vCenter.
         If datacenter_name is specified, return a tuple with the matching datacenter and its name.
         """
-        content = self.si.content
+        if self._use_snapshot(['Datacenter']):
+            return self._snapshot_datacenters(datacenter_name, self._snapshot)
+
+        return self._snapshot_datacenters(datacenter_name, self._name_index())
 
+    def get_datacenter_names(self):
+        """
+        Retrieve the names of the datacenters in the vCenter.
+        With a cache configured this reads the cached records and doesn't log in.
+        """
+        if self._use_snapshot(['Datacenter']):
+            snapshot = self._snapshot
+        else:
+            snapshot = self._name_index()
+        return sorted(dc['name'] for dc in snapshot.of_type('Datacenter'))
+
+    def _snapshot_datacenters(self, datacenter_name, snapshot):
+        """
+        Snapshot-backed get_datacenters.
+        """
         if not datacenter_name:
-            datacenters = {dc for dc in content.rootFolder.childEntity if isinstance(dc, vim.Datacenter)}
-            return datacenters
+            return {self._managed_object(dc['_moid'], snapshot) for dc in snapshot.of_type('Datacenter')}
 
-        datacenters = {dc for dc in content.rootFolder.childEntity if isinstance(dc, vim.Datacenter)}        
-        for dc in datacenters:
-            if dc.name == datacenter_name:
-                return dc
+        dc = snapshot.find('Datacenter', datacenter_name)
+        if not dc:
+            raise Exception(f"No datacenter found with the name '{datacenter_name}'")
+        return self._managed_object(dc['_moid'], snapshot)
 
-        raise Exception(f"No datacenter found with the name '{datacenter_name}'")
+    def _snapshot_cluster(self, datacenter_name, cluster_name, snapshot=None):
+        """
+        Return the snapshot records for a datacenter and one of its clusters.
+        """
+        snapshot = snapshot or self._snapshot
+        dc = snapshot.find('Datacenter', datacenter_name)
+        if not dc:
+            raise Exception(f"No datacenter found with the name '{datacenter_name}'")
+        cluster = snapshot.find('ClusterComputeResource', cluster_name, datacenter=dc)
+        if not cluster:
+            raise Exception(f"No cluster found with the name '{cluster_name}'")
+        return dc, cluster
     
     def get_clusters_object(self, datacenter_name, cluster_name):
         """
         Retrieve a list of cluster objects in the vCenter.
         """
-        datacenter = self.get_datacenters(datacenter_name)
-        for cluster in datacenter.hostFolder.childEntity:
-            if isinstance(cluster, vim.ClusterComputeResource) and cluster.name == cluster_name:
-                return cluster
-        raise Exception(f"No cluster found with the name '{cluster_name}'")
+        if self._use_snapshot(['Datacenter', 'Folder', 'ClusterComputeResource']):
+            _, cluster = self._snapshot_cluster(datacenter_name, cluster_name)
+            return self._managed_object(cluster['_moid'])
+
+        index = self._name_index()
+        _, cluster = self._snapshot_cluster(datacenter_name, cluster_name, index)
+        return self._managed_object(cluster['_moid'], index)
 
 
     def get_clusters(self, datacenter_name):
@@ -84,18 +929,48 @@ class VcenterFacts:
         Retrieve a list of dictionaries, mapping cluster names to datacenter names.
         If datacenters are not specified, retrieves all datacenters.
         """
+        if self._use_snapshot(['Datacenter', 'Folder', 'ClusterComputeResource']):
+            return self._snapshot_clusters(datacenter_name)
+
+        index = self._name_index()
+        dc = index.find('Datacenter', datacenter_name)
+        if not dc:
+            raise Exception(f"No datacenter found with the name '{datacenter_name}'")
+
+        clusters = []
+        for record in index.of_type('ClusterComputeResource'):
+            if index.datacenter_of(record['_moid']) is not dc:
+                continue
+            cluster = self._managed_object(record['_moid'], index)
+            total_memory = cluster.summary.totalMemory
+            total_cores = cluster.summary.numCpuCores
+            clusters.append({
+                'name': record['name'],
+                'datacenter': dc['name'],
+                'total_memory': total_memory,
+                'total_cores': total_cores,
+                })
+
+        return clusters
+
+    def _snapshot_clusters(self, datacenter_name):
+        """
+        Snapshot-backed get_clusters.
+        """
+        dc = self._snapshot.find('Datacenter', datacenter_name)
+        if not dc:
+            raise Exception(f"No datacenter found with the name '{datacenter_name}'")
+
         clusters = []
-        datacenter = self.get_datacenters(datacenter_name)
-        for cluster in datacenter.hostFolder.childEntity:
-            if isinstance(cluster, vim.ClusterComputeResource):
-                total_memory = cluster.summary.totalMemory
-                total_cores = cluster.summary.numCpuCores
-                clusters.append({
-                    'name': cluster.name,
-                    'datacenter': datacenter.name,
-                    'total_memory': total_memory,
-                    'total_cores': total_cores,
-                    })
+        for cluster in self._snapshot.of_type('ClusterComputeResource'):
+            if self._snapshot.datacenter_of(cluster['_moid']) is not dc:
+                continue
+            clusters.append({
+                'name': cluster['name'],
+                'datacenter': dc['name'],
+                'total_memory': cluster.get('summary.totalMemory'),
+                'total_cores': cluster.get('summary.numCpuCores'),
+                })
 
         return clusters
 
@@ -105,18 +980,48 @@ class VcenterFacts:
         each with its name, free space, and total space.
         If datacenters are not specified, retrieves all datacenters.
         """
-        datacenter = self.get_datacenters(datacenter_name)
+        if self._use_snapshot(['Datacenter', 'Folder', 'StoragePod']):
+            return self._snapshot_datastore_clusters(datacenter_name)
+
+        index = self._name_index()
+        dc = index.find('Datacenter', datacenter_name)
+        if not dc:
+            raise Exception(f"No datacenter found with the name '{datacenter_name}'")
+
         datastore_clusters = []
-        for cluster in datacenter.datastoreFolder.childEntity:
-            if isinstance(cluster, vim.StoragePod):
-                free_space = cluster.summary.freeSpace
-                total_space = cluster.summary.capacity
-                datastore_clusters.append({
-                    'name': cluster.name,
-                    'datacenter': datacenter.name,
-                    'free_space': free_space,
-                    'total_space': total_space,
-                })
+        for record in index.of_type('StoragePod'):
+            if index.datacenter_of(record['_moid']) is not dc:
+                continue
+            cluster = self._managed_object(record['_moid'], index)
+            free_space = cluster.summary.freeSpace
+            total_space = cluster.summary.capacity
+            datastore_clusters.append({
+                'name': record['name'],
+                'datacenter': dc['name'],
+                'free_space': free_space,
+                'total_space': total_space,
+            })
+
+        return datastore_clusters
+
+    def _snapshot_datastore_clusters(self, datacenter_name):
+        """
+        Snapshot-backed get_datastore_clusters.
+        """
+        dc = self._snapshot.find('Datacenter', datacenter_name)
+        if not dc:
+            raise Exception(f"No datacenter found with the name '{datacenter_name}'")
+
+        datastore_clusters = []
+        for pod in self._snapshot.of_type('StoragePod'):
+            if self._snapshot.datacenter_of(pod['_moid']) is not dc:
+                continue
+            datastore_clusters.append({
+                'name': pod['name'],
+                'datacenter': dc['name'],
+                'free_space': pod.get('summary.freeSpace'),
+                'total_space': pod.get('summary.capacity'),
+            })
 
         return datastore_clusters
     
@@ -125,19 +1030,14 @@ class VcenterFacts:
         Find the datastore with the most available storage in the specified datastore cluster.
         If a datacenter is specified, only consider datastores in that datacenter.
         """
-        datacenters = self.get_datacenters()
-        datastore_cluster = None
+        if self._use_snapshot(['StoragePod', 'Datastore']):
+            return self._snapshot_datastore_with_most_space(datastore_cluster_name)
 
-        for datacenter in datacenters:
-            for cluster in datacenter.datastoreFolder.childEntity:
-                if isinstance(cluster, vim.StoragePod) and cluster.name == datastore_cluster_name:
-                    datastore_cluster = cluster
-                    break
-            if datastore_cluster:
-                break
-
-        if not datastore_cluster:
+        index = self._name_index()
+        record = index.find('StoragePod', datastore_cluster_name)
+        if not record:
             raise Exception(f"No datastore cluster found with the name '{datastore_cluster_name}'")
+        datastore_cluster = self._managed_object(record['_moid'], index)
 
         datastores = datastore_cluster.childEntity
 
@@ -154,91 +1054,340 @@ class VcenterFacts:
             'total_space': max_datastore.summary.capacity
         }
 
+    def _snapshot_datastore_with_most_space(self, datastore_cluster_name):
+        """
+        Snapshot-backed get_datastore_with_most_space_in_cluster.
+        """
+        pod = self._snapshot.find('StoragePod', datastore_cluster_name)
+        if not pod:
+            raise Exception(f"No datastore cluster found with the name '{datastore_cluster_name}'")
 
-    def get_networks(self, datacenter_name, clusters=None):
+        datastores = [
+            self._snapshot.records[moid] for moid in pod.get('childEntity', [])
+            if moid in self._snapshot.by_type['Datastore']
+        ]
+        if not datastores:
+            raise Exception("No datastores found in the specified datastore cluster")
+
+        # Membership comes from the snapshot, free space is read live
+        space = self._datastore_space([ds['_moid'] for ds in datastores])
+        max_datastore = max(datastores, key=lambda x: space.get(x['_moid'], {}).get('summary.freeSpace') or 0)
+        max_space = space.get(max_datastore['_moid'], {})
+
+        return {
+            'name': max_datastore['name'],
+            'datastore_cluster': datastore_cluster_name,
+            'free_space': max_space.get('summary.freeSpace'),
+            'total_space': max_space.get('summary.capacity')
+        }
+
+    def get_datastore_with_most_space_in_compute_cluster(self, compute_cluster_name, datastore_cluster_name=None):
+        """
+        Find the datastore with the most available storage that is mounted on the hosts
+        of the specified compute cluster.
+        If a datastore cluster is specified, only consider datastores in that datastore cluster.
+        """
+        object_types = ['ClusterComputeResource', 'HostSystem', 'StoragePod', 'Datastore']
+        from_snapshot = self._use_snapshot(object_types)
+        if from_snapshot:
+            snapshot = self._snapshot
+        else:
+            property_specs = [
+                (vim.ClusterComputeResource, ['name', 'host']),
+                (vim.HostSystem, ['datastore']),
+                (vim.StoragePod, ['name', 'childEntity']),
+                (vim.Datastore, ['name', 'summary.freeSpace', 'summary.capacity']),
+            ]
+            snapshot = self._bulk_records(property_specs)
+
+        compute_cluster = snapshot.find('ClusterComputeResource', compute_cluster_name)
+        if not compute_cluster:
+            raise Exception(f"No compute cluster found with the name '{compute_cluster_name}'")
+
+        candidates = set()
+        for host_id in compute_cluster.get('host', []):
+            host = snapshot.records.get(host_id)
+            if host:
+                candidates.update(host.get('datastore', []))
+
+        if datastore_cluster_name:
+            datastore_cluster = snapshot.find('StoragePod', datastore_cluster_name)
+            if not datastore_cluster:
+                raise Exception(f"No datastore cluster found with the name '{datastore_cluster_name}'")
+            candidates &= set(datastore_cluster.get('childEntity', []))
+
+        datastores = [snapshot.by_type['Datastore'][moid] for moid in candidates if moid in snapshot.by_type['Datastore']]
+        if not datastores and datastore_cluster_name:
+            raise Exception("No datastores found in the specified datastore cluster and compute cluster")
+        if not datastores:
+            raise Exception(f"No datastores found in the specified compute cluster '{compute_cluster_name}'")
+
+        # Find the datastore with the most free space, read live when the topology came from the snapshot
+        if from_snapshot:
+            space = self._datastore_space([ds['_moid'] for ds in datastores])
+        else:
+            space = {ds['_moid']: ds for ds in datastores}
+        max_datastore = max(datastores, key=lambda x: space.get(x['_moid'], {}).get('summary.freeSpace') or 0)
+        max_space = space.get(max_datastore['_moid'], {})
+
+        result = {
+            'name': max_datastore['name'],
+            'compute_cluster': compute_cluster_name,
+            'free_space': max_space.get('summary.freeSpace'),
+            'total_space': max_space.get('summary.capacity')
+        }
+        if datastore_cluster_name:
+            result['datastore_cluster'] = datastore_cluster_name
+        return result
+
+    def get_networks(self, datacenters=None, clusters=None):
         """
-        Retrieve a list of dictionaries, mapping network names to datacenter and cluster names.
+        Retrieve a list of dictionaries, one per network, with the network name and
+        the datacenters and clusters that carry it.
+        datacenters and clusters may be a name or a list of names.
         If datacenters or clusters are not specified, retrieves all datacenters or clusters.
         """
-        datacenter = self.get_datacenters(datacenter_name)
+        if isinstance(datacenters, str):
+            datacenters = [datacenters]
+        if isinstance(clusters, str):
+            clusters = [clusters]
+
+        if self._use_snapshot(['Datacenter', 'Folder', 'ClusterComputeResource', 'Network']):
+            snapshot = self._snapshot
+        else:
+            property_specs = [
+                (vim.Datacenter, ['name', 'parent']),
+                (vim.Folder, ['name', 'parent']),
+                (vim.ClusterComputeResource, ['name', 'parent', 'network']),
+                (vim.Network, ['name']),
+            ]
+            snapshot = self._bulk_records(property_specs)
 
-        networks = []
-        dc_clusters = [self.get_clusters_object(datacenter_name, clusters)]
-        for cluster in dc_clusters:
-            if not isinstance(cluster, vim.ClusterComputeResource):
+        selected_dcs = None
+        if datacenters:
+            selected_dcs = set()
+            for datacenter_name in datacenters:
+                dc = snapshot.find('Datacenter', datacenter_name)
+                if not dc:
+                    raise Exception(f"No datacenter found with the name '{datacenter_name}'")
+                selected_dcs.add(dc['_moid'])
+
+        networks = {}
+        found_clusters = set()
+        for cluster in snapshot.of_type('ClusterComputeResource'):
+            if clusters and cluster['name'] not in clusters:
                 continue
-            if not cluster.network:
+            dc = snapshot.datacenter_of(cluster['_moid'])
+            if selected_dcs is not None and (dc is None or dc['_moid'] not in selected_dcs):
                 continue
-            for network in cluster.network:
-                networks.append({
-                    'name': network.name,
-                    'datacenter': datacenter_name,
-                    'cluster': cluster.name,
+            found_clusters.add(cluster['name'])
+
+            for moid in cluster.get('network', []):
+                network = snapshot.records.get(moid)
+                if network is None:
+                    continue
+                entry = networks.setdefault(network['name'], {
+                    'name': network['name'],
+                    'datacenters': [],
+                    'clusters': [],
                 })
+                if dc and dc['name'] not in entry['datacenters']:
+                    entry['datacenters'].append(dc['name'])
+                if cluster['name'] not in entry['clusters']:
+                    entry['clusters'].append(cluster['name'])
+
+        for cluster_name in clusters or []:
+            if cluster_name not in found_clusters:
+                raise Exception(f"No cluster found with the name '{cluster_name}'")
 
-        return networks
+        return list(networks.values())
     
     def get_template(self, cluster_name):
         """
         Retrieve all VM templates in the given cluster.
         """
-        cluster_obj = self._find_cluster(cluster_name)
-        if not cluster_obj:
+        return [
+            vim.VirtualMachine(template['moid'], self.si._stub)
+            for template in self._template_records(cluster_name)
+        ]
+
+    def get_template_path(self, cluster_name=None, template_name=None):
+        """
+        Retrieve a dictionary mapping template names to their paths, for the given
+        cluster or for all clusters if cluster_name is not specified.
+        If template_name is specified, return only the path of that template.
+        Raises an exception if a template name is used by more than one template,
+        as a name alone can't tell them apart.
+        """
+        by_name = {}
+        for template in self._template_records(cluster_name):
+            by_name.setdefault(template['name'], []).append(template)
+
+        if template_name:
+            if template_name not in by_name:
+                raise Exception(f"No template found with the name '{template_name}'")
+            by_name = {template_name: by_name[template_name]}
+
+        templates = {}
+        for name, matches in by_name.items():
+            if len(matches) > 1:
+                paths = ', '.join(f"{t['path']} ({t['cluster']})" for t in matches)
+                raise Exception(
+                    f"More than one template found with the name '{name}', set a cluster to choose one: {paths}"
+                )
+            templates[name] = matches[0]['path']
+        return templates[template_name] if template_name else templates
+
+    def _template_records(self, cluster_name=None):
+        """
+        Return the MoRef ID, name, cluster and path of every template, optionally
+        limited to one cluster. Only name, parent, config.template and runtime.host
+        are fetched for VMs, in bulk, instead of each VM's full config.
+        """
+        if self._use_snapshot(['ClusterComputeResource', 'VirtualMachine']):
+            snapshot = self._snapshot
+        else:
+            property_specs = [
+                (vim.ClusterComputeResource, ['name', 'host']),
+                (vim.VirtualMachine, ['name', 'parent', 'config.template', 'runtime.host']),
+            ]
+            snapshot = self._bulk_records(property_specs)
+
+        if cluster_name and not snapshot.find('ClusterComputeResource', cluster_name):
             raise Exception(f"No cluster found with the name '{cluster_name}'")
 
-        # Loop through VMs in the cluster and add templates to the list
-        template_objs = []
-        for vm in cluster_obj.vm:
-            if isinstance(vm, vim.VirtualMachine) and vm.config.template:
-                template_objs.append(vm)
+        host_clusters = {}
+        for cluster in snapshot.of_type('ClusterComputeResource'):
+            for host in cluster.get('host', []):
+                host_clusters[host] = cluster['name']
+
+        folder_paths = {f['moid']: f['path'] for f in self._folder_records()}
+
+        templates = []
+        for vm in snapshot.of_type('VirtualMachine'):
+            if not vm.get('config.template'):
+                continue
+            cluster = host_clusters.get(vm.get('runtime.host'))
+            if cluster_name and cluster != cluster_name:
+                continue
+            folder_path = folder_paths.get(vm.get('parent'))
+            templates.append({
+                'moid': vm['_moid'],
+                'name': vm['name'],
+                'cluster': cluster,
+                'path': f"{folder_path}/{vm['name']}" if folder_path else vm['name'],
+            })
+
+        return templates
+
+    def get_guest_ips(self):
+        """
+        Retrieve the IP addresses reported by VMware Tools for every virtual machine in the vCenter.
+        Return a set of IP address strings.
+        """
+        ips = set()
+        for _, props in self._retrieve_properties([(vim.VirtualMachine, ['guest.net'])]):
+            for nic in props.get('guest.net') or []:
+                ips.update(nic.ipAddress or [])
+        return ips
 
-        return template_objs
-    
     def get_folders(self):
         """
         Find all folders in the vCenter inventory.
         Return a list of dictionaries containing the folder name and its path.
         """
-        root_folder = self.get_root()
-        if not isinstance(root_folder, vim.Folder):
-            return None
+        return [{'name': f['name'], 'path': f['path']} for f in self._folder_records()]
 
-        folder_objs = []
-        for dc in root_folder.childEntity:
-            if isinstance(dc, vim.Datacenter):
-                folder_objs.extend(self._get_dc_folders(dc))
+    def get_folder_path(self, folder_name, parent_folder_name=None):
+        """
+        Return the path of the VM folder with the given name.
+        If parent_folder_name is specified, only folders somewhere below a folder with
+        that name are considered. Raises an exception if no folder or more than one
+        folder matches.
+        """
+        by_name, by_ancestor = self._folder_index()
+        if parent_folder_name:
+            matches = by_ancestor.get((parent_folder_name, folder_name), [])
+        else:
+            matches = by_name.get(folder_name, [])
 
-        return [{'name': f['folder'].name, 'path': f['path']} for f in folder_objs]
+        if not matches:
+            raise Exception(f"No folder found with the name '{folder_name}'")
+        if len(matches) > 1:
+            paths = ', '.join(f['path'] for f in matches)
+            raise Exception(f"More than one folder found with the name '{folder_name}': {paths}")
+        return matches[0]['path']
+
+    def _folder_index(self):
+        """
+        Return the folder name index and (ancestor name, name) index, built once from
+        the bulk folder records and kept for the lifetime of this object. Each folder
+        is indexed under every distinct name on its path, so building the index costs
+        O(depth) per folder and a lookup below any ancestor is a single dictionary read.
+        """
+        if self._folders is None:
+            by_name = {}
+            by_ancestor = {}
+            for folder in self._folder_records():
+                by_name.setdefault(folder['name'], []).append(folder)
+                for ancestor_name in set(folder['ancestor_names']):
+                    by_ancestor.setdefault((ancestor_name, folder['name']), []).append(folder)
+            self._folders = (by_name, by_ancestor)
 
+        return self._folders
 
-    def _get_dc_folders(self, datacenter, path=""):
+    def _folder_records(self):
         """
-        Helper method to recursively find all folders under a given datacenter object.
-        Returns a list of dictionaries containing the folder object and its path.
+        Return the VM folders of every datacenter as dictionaries with the folder's
+        MoRef ID, name and path, built from bulk-fetched name/parent properties.
         """
-        folder_objs = []
-        folder_objs.append({'folder': datacenter.vmFolder, 'path': f"{datacenter.name}/vm"})
-        for item in datacenter.vmFolder.childEntity:
-            if isinstance(item, vim.Folder):
-                subpath = f"{path}/{item.name}" if path else item.name
-                folder_objs.append({'folder': item, 'path': f"{datacenter.name}/{subpath}"})
-                folder_objs.extend(self._get_subfolders(item, f"{datacenter.name}/{subpath}"))
+        if self._use_snapshot(['Datacenter', 'Folder']):
+            return self._folder_paths(self._snapshot)
 
-        return folder_objs
+        property_specs = [
+            (vim.Datacenter, ['name', 'vmFolder']),
+            (vim.Folder, ['name', 'parent']),
+        ]
+        folders = self._bulk_records(property_specs)
 
+        return self._folder_paths(folders)
 
-    def _get_subfolders(self, parent_folder, path=""):
+    def _folder_paths(self, snapshot):
         """
-        Helper method to recursively find all subfolders of a given parent folder.
-        Returns a list of dictionaries containing the folder object and its path.
+        Rebuild folder paths locally from name/parent records.
+        A datacenter's VM folder is '<datacenter>/vm' and folders below it are
+        '<datacenter>/<folder>/<subfolder>'.
         """
-        folder_objs = []
-        for item in parent_folder.childEntity:
-            if isinstance(item, vim.Folder):
-                subpath = f"{path}/{item.name}" if path else item.name
-                folder_objs.append({'folder': item, 'path': subpath})
-                folder_objs.extend(self._get_subfolders(item, subpath))
+        children = {}
+        for folder in snapshot.of_type('Folder'):
+            children.setdefault(folder.get('parent'), []).append(folder)
 
-        return folder_objs
+        folder_objs = []
+        for dc in snapshot.of_type('Datacenter'):
+            vm_folder = snapshot.records.get(dc.get('vmFolder'))
+            if vm_folder is None:
+                continue
+            folder_objs.append({
+                'moid': vm_folder['_moid'],
+                'name': vm_folder['name'],
+                'ancestor_names': [dc['name']],
+                'path': f"{dc['name']}/vm",
+            })
 
+            ancestors = [dc['name'], vm_folder['name']]
+            stack = [(child, ancestors, dc['name']) for child in reversed(children.get(vm_folder['_moid'], []))]
+            while stack:
+                folder, ancestor_names, parent_path = stack.pop()
+                path = f"{parent_path}/{folder['name']}"
+                folder_objs.append({
+                    'moid': folder['_moid'],
+                    'name': folder['name'],
+                    'ancestor_names': ancestor_names,
+                    'path': path,
+                })
+                child_ancestors = ancestor_names + [folder['name']]
+                stack.extend(
+                    (child, child_ancestors, path) for child in reversed(children.get(folder['_moid'], []))
+                )
 
+        return folder_objs
@@ -33,6 +33,20 @@ options:
     description: The name of the datacenter to filter by. If not specified, retrieves all clusters.
     required: false
     type: list
+  cache_path:
+    description: The SQLite file the vCenter inventory is cached in. An empty value disables the cache.
+    required: false
+    default: ~/.cache/vm_facts/inventory.db
+    type: path
+  ttl:
+    description: How many seconds cached inventory is used before it is fetched from vCenter again. Defaults to a TTL per object type.
+    required: false
+    type: int
+  force:
+    description: Drop the cached inventory of this vCenter account and fetch it from vCenter again.
+    required: false
+    default: false
+    type: bool
 '''
 
 EXAMPLES = '''
@@ -51,7 +65,7 @@ EXAMPLES = '''
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from vcenter_helper import VcenterFacts
+from vcenter_helper import CACHE_ARGUMENT_SPEC, VcenterFacts, cache_options
 
 
 def main():
@@ -61,6 +75,7 @@ def main():
         password=dict(type='str', required=True, no_log=True),
         disable_ssl_verification=dict(type='bool', default=False),
         datacenter=dict(type='str', required=False),
+        **CACHE_ARGUMENT_SPEC,
     )
 
     module = AnsibleModule(
@@ -74,7 +89,10 @@ def main():
         module.params['username'],
         module.params['password'],
         module.params['disable_ssl_verification'],
+        **cache_options(module.params),
     )
+    if module.params['force']:
+        vcenter_facts.invalidate_cache()
     clusters = vcenter_facts.get_clusters(module.params['datacenter'])
 
     module.exit_json(changed=False, ansible_facts=dict(vcenter_clusters=clusters))
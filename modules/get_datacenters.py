@@ -28,6 +28,20 @@ options:
     required: false
     default: false
     type: bool
+  cache_path:
+    description: The SQLite file the vCenter inventory is cached in. An empty value disables the cache.
+    required: false
+    default: ~/.cache/vm_facts/inventory.db
+    type: path
+  ttl:
+    description: How many seconds cached inventory is used before it is fetched from vCenter again. Defaults to a TTL per object type.
+    required: false
+    type: int
+  force:
+    description: Drop the cached inventory of this vCenter account and fetch it from vCenter again.
+    required: false
+    default: false
+    type: bool
 '''
 
 EXAMPLES = '''
@@ -44,7 +58,8 @@ EXAMPLES = '''
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from vcenter_helper import VcenterFacts
+from pyVmomi import vim
+from vcenter_helper import CACHE_ARGUMENT_SPEC, VcenterFacts, cache_options
 
 def main():
     module_args = dict(
@@ -52,6 +67,7 @@ def main():
         username=dict(type='str', required=True),
         password=dict(type='str', required=True, no_log=True),
         disable_ssl_verification=dict(type='bool', default=False),
+        **CACHE_ARGUMENT_SPEC,
     )
 
     module = AnsibleModule(
@@ -65,16 +81,18 @@ def main():
         module.params['username'],
         module.params['password'],
         module.params['disable_ssl_verification'],
+        **cache_options(module.params),
     )
+    if module.params['force']:
+        vcenter_facts.invalidate_cache()
     result = {}
     try:
-        datacenter = vcenter_facts.get_datacenters()
-        result['datacenter'] = [dc.name for dc in datacenter]
+        result['datacenter'] = vcenter_facts.get_datacenter_names()
     except vim.fault.InvalidLogin as e:
         result['error'] = f"Failed to authenticate to vCenter: {str(e)}"
         module.fail_json(msg=result['error'])
     except Exception as e:
-        result['error'] = f"Failed to retrieve datacenter {datacenter}: {str(e)}"
+        result['error'] = f"Failed to retrieve datacenters: {str(e)}"
         module.fail_json(msg=result['error'])
 
     module.exit_json(**result)
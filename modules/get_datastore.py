@@ -31,10 +31,29 @@ options:
             - The name of the datastore cluster for which to retrieve information.
             - If not specified, retrieves information for all datastore clusters.
         required: true   
+    compute_cluster:
+        description:
+            - The name of a compute cluster.
+            - If specified, only datastores mounted on the hosts of this compute cluster are considered.
+        required: false
      disable_ssl_verification:
         description:
             - Whether to disable SSL verification when connecting to the vCenter server.
         required: false
+    cache_path:
+        description:
+            - The SQLite file the vCenter inventory is cached in. An empty value disables the cache.
+        required: false
+        default: ~/.cache/vm_facts/inventory.db
+    ttl:
+        description:
+            - How many seconds cached inventory is used before it is fetched from vCenter again.
+            - Defaults to a TTL per object type.
+        required: false
+    force:
+        description:
+            - Drop the cached inventory of this vCenter account and fetch it from vCenter again.
+        required: false
 '''
 EXAMPLES = '''
     - name: Retrieve information about all datastore clusters
@@ -48,18 +67,27 @@ EXAMPLES = '''
         username: admin
         password: password123
         datastore_cluster_name: Production Datastore Cluster
+    - name: Retrieve the datastore with the most space reachable from a compute cluster
+      vcenter_datastore_facts:
+        vcenter: vcenter.example.com
+        username: admin
+        password: password123
+        datastore_cluster_name: Production Datastore Cluster
+        compute_cluster: Production Cluster
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from vcenter_helper import VcenterFacts
+from vcenter_helper import CACHE_ARGUMENT_SPEC, VcenterFacts, cache_options
 
 def main():
     module_args = dict(
         vcenter=dict(type='str', required=True),
         username=dict(type='str', required=True, no_log=True),
         password=dict(type='str', required=True, no_log=True),
-        disable_ssl_verification=dict(stype=bool, default=False),
-        datastore_cluster=dict(type='str', required=True)
+        disable_ssl_verification=dict(type='bool', default=False),
+        datastore_cluster=dict(type='str', required=True),
+        compute_cluster=dict(type='str', required=False),
+        **CACHE_ARGUMENT_SPEC,
     )
 
     result = dict(
@@ -81,13 +109,24 @@ def main():
     password = module.params['password']
     disable_ssl_verification = module.params['disable_ssl_verification']
     datastore_cluster = module.params['datastore_cluster']
+    compute_cluster = module.params['compute_cluster']
 
     try:
-        vcenter_facts = VcenterFacts(vcenter, username, password, disable_ssl_verification)
-        datastore = vcenter_facts.get_datastore_with_most_space_in_cluster(datastore_cluster)
+        vcenter_facts = VcenterFacts(
+            vcenter, username, password, disable_ssl_verification, **cache_options(module.params)
+        )
+        if module.params['force']:
+            vcenter_facts.invalidate_cache()
+        if compute_cluster:
+            datastore = vcenter_facts.get_datastore_with_most_space_in_compute_cluster(compute_cluster, datastore_cluster)
+        else:
+            datastore = vcenter_facts.get_datastore_with_most_space_in_cluster(datastore_cluster)
         result['datastore'] = datastore
     except Exception as e:
-        result['error'] = f"Failed to retrieve datastore with most available storage in datastore cluster {datastore}: {str(e)}"
+        if compute_cluster:
+            result['error'] = f"Failed to retrieve datastore with most available storage in datastore cluster {datastore_cluster} for compute cluster {compute_cluster}: {str(e)}"
+        else:
+            result['error'] = f"Failed to retrieve datastore with most available storage in datastore cluster {datastore_cluster}: {str(e)}"
         module.fail_json(msg=result['error'])
 
     module.exit_json(**result)
@@ -34,6 +34,20 @@ options:
         description:
             - Whether to disable SSL verification when connecting to the vCenter server.
         required: false
+    cache_path:
+        description:
+            - The SQLite file the vCenter inventory is cached in. An empty value disables the cache.
+        required: false
+        default: ~/.cache/vm_facts/inventory.db
+    ttl:
+        description:
+            - How many seconds cached inventory is used before it is fetched from vCenter again.
+            - Defaults to a TTL per object type.
+        required: false
+    force:
+        description:
+            - Drop the cached inventory of this vCenter account and fetch it from vCenter again.
+        required: false
 '''
 EXAMPLES = '''
     - name: Retrieve information about all datastore clusters
@@ -50,7 +64,7 @@ EXAMPLES = '''
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from vcenter_helper import VcenterFacts
+from vcenter_helper import CACHE_ARGUMENT_SPEC, VcenterFacts, cache_options
 
 def main():
     module_args = dict(
@@ -58,7 +72,8 @@ def main():
         username=dict(type='str', required=True, no_log=True),
         password=dict(type='str', required=True, no_log=True),
         disable_ssl_verification=dict(stype=bool, default=False),
-        datacenter=dict(type='str', required=True)
+        datacenter=dict(type='str', required=True),
+        **CACHE_ARGUMENT_SPEC,
     )
 
     result = dict(
@@ -82,7 +97,11 @@ def main():
     disable_ssl_verification = module.params['disable_ssl_verification']
 
     try:
-        vcenter_facts = VcenterFacts(vcenter, username, password, disable_ssl_verification)
+        vcenter_facts = VcenterFacts(
+            vcenter, username, password, disable_ssl_verification, **cache_options(module.params)
+        )
+        if module.params['force']:
+            vcenter_facts.invalidate_cache()
         datastore_cluster = vcenter_facts.get_datastore_clusters(datacenter)
         result['datastore_cluster'] = datastore_cluster
     except Exception as e:
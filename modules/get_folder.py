@@ -7,7 +7,7 @@ version_added: 1.0.0
 short_description: Get a folder in vCenter by name and return its path.
 description:
   - This module uses the vCenter API to retrieve a folder by name and return its full path.
-  - You can optionally provide the name of the folder's parent folder to help narrow the search.
+  - You can optionally provide the name of a folder above it to help narrow the search.
 author:
   - "Louis Tiches"
 options:
@@ -33,9 +33,23 @@ options:
     required: true
     type: str
   parent_folder_name:
-    description: The name of the parent folder to search under. If not provided, search from the root folder.
+    description: The name of a folder to search under. The folder can be at any depth below it. If not provided, search from the root folder.
     required: false
     type: str
+  cache_path:
+    description: The SQLite file the vCenter inventory is cached in. An empty value disables the cache.
+    required: false
+    default: ~/.cache/vm_facts/inventory.db
+    type: path
+  ttl:
+    description: How many seconds cached inventory is used before it is fetched from vCenter again. Defaults to a TTL per object type.
+    required: false
+    type: int
+  force:
+    description: Drop the cached inventory of this vCenter account and fetch it from vCenter again.
+    required: false
+    default: false
+    type: bool
 '''
 
 EXAMPLES = '''
@@ -54,7 +68,7 @@ EXAMPLES = '''
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from vcenter_helper import VcenterFacts
+from vcenter_helper import CACHE_ARGUMENT_SPEC, VcenterFacts, cache_options
 
 
 def main():
@@ -65,6 +79,7 @@ def main():
         disable_ssl_verification=dict(type='bool', default=False),
         folder_name=dict(type='str', required=True),
         parent_folder_name=dict(type='str', required=False),
+        **CACHE_ARGUMENT_SPEC,
     )
 
     result = dict(
@@ -87,10 +102,19 @@ def main():
         module.params['username'],
         module.params['password'],
         module.params['disable_ssl_verification'],
+        **cache_options(module.params),
     )
-    folder_path = vcenter_facts.get_folder_path(
-        module.params['folder_name']
-    )
+    if module.params['force']:
+        vcenter_facts.invalidate_cache()
+    try:
+        folder_path = vcenter_facts.get_folder_path(
+            module.params['folder_name'],
+            module.params['parent_folder_name'],
+        )
+    except Exception as e:
+        result['error'] = f"Failed to retrieve folder {module.params['folder_name']}: {str(e)}"
+        module.fail_json(msg=result['error'])
+
     result['vcenter_folder'] = folder_path
     module.exit_json(**result)
 
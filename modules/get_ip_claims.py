@@ -0,0 +1,95 @@
+#!/usr/bin/python
+
+DOCUMENTATION = '''
+---
+module: get_ip_claims
+version_added: 1.0.0
+short_description: Find which of a list of IP addresses are already assigned to Satellite hosts.
+description:
+  - This module searches Satellite for hosts using any of the provided IP addresses.
+  - The addresses are combined into OR-ed searches (C(ip=a or ip=b ...)) of up to 100 addresses each,
+    so a whole build wave is checked in one or a few requests.
+  - Returns a dictionary mapping every claimed IP address to the name of the host that claimed it.
+author:
+  - "Louis Tiches"
+options:
+  satellite_fqdn:
+    description: The hostname of the Satellite server.
+    required: true
+    type: str
+  username:
+    description: The username to use for authentication with the Satellite server.
+    required: true
+    type: str
+  password:
+    description: The password to use for authentication with the Satellite server.
+    required: true
+    type: str
+  validate_certs:
+    description: Whether to validate the SSL certificate of the Satellite server.
+    required: false
+    default: false
+    type: bool
+  ips:
+    description: The IP addresses to look up.
+    required: true
+    type: list
+'''
+
+EXAMPLES = '''
+- name: Search for IP addresses in Satellite
+  get_ip_claims:
+    satellite_fqdn: satellite.example.com
+    username: admin
+    password: password
+    ips:
+      - 10.1.2.10
+      - 10.1.2.11
+  register: satellite_claims
+
+- name: Debug claimed IP addresses
+  debug:
+    var: satellite_claims.claims
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from satellite_helper import SatelliteApi
+
+
+def main():
+    module_args = dict(
+        satellite_fqdn=dict(type='str', required=True),
+        username=dict(type='str', required=True),
+        password=dict(type='str', required=True, no_log=True),
+        validate_certs=dict(type='bool', default=False),
+        ips=dict(type='list', elements='str', required=True),
+    )
+
+    result = dict(
+        changed=False,
+        claims={},
+        error="",
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+
+    satellite = SatelliteApi(
+        module.params['satellite_fqdn'],
+        module.params['username'],
+        module.params['password'],
+        module.params['validate_certs'],
+    )
+    try:
+        claims = satellite.get_ip_claims(module.params['ips'])
+    except Exception as e:
+        result['error'] = f"Failed to search for IP addresses: {str(e)}"
+        module.fail_json(msg=result['error'])
+
+    result['claims'] = claims
+    module.exit_json(**result)
+
+if __name__ == '__main__':
+    main()
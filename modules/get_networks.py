@@ -8,7 +8,7 @@ short_description: Retrieve a list of networks connected to more than one datace
 description:
   - This module uses the vCenter API to retrieve a list of networks connected to more than one datacenter and more than one cluster.
   - You can filter the networks by datacenters and/or clusters.
-  - Returns a list of dictionaries containing the network name, datacenter name, and cluster name for each network.
+  - Returns one dictionary per network containing the network name and the lists of datacenter and cluster names that carry it.
 author:
   - "Louis Tiches"
 options:
@@ -39,6 +39,20 @@ options:
     required: false
     default: []
     type: list
+  cache_path:
+    description: The SQLite file the vCenter inventory is cached in. An empty value disables the cache.
+    required: false
+    default: ~/.cache/vm_facts/inventory.db
+    type: path
+  ttl:
+    description: How many seconds cached inventory is used before it is fetched from vCenter again. Defaults to a TTL per object type.
+    required: false
+    type: int
+  force:
+    description: Drop the cached inventory of this vCenter account and fetch it from vCenter again.
+    required: false
+    default: false
+    type: bool
 '''
 
 EXAMPLES = '''
@@ -59,7 +73,7 @@ EXAMPLES = '''
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from vcenter_helper import VcenterFacts
+from vcenter_helper import CACHE_ARGUMENT_SPEC, VcenterFacts, cache_options
 
 
 def main():
@@ -68,8 +82,9 @@ def main():
         username=dict(type='str', required=True),
         password=dict(type='str', required=True, no_log=True),
         disable_ssl_verification=dict(type='bool', default=False),
-        datacenters=dict(type='str', required=True)
-        clusters=dict(type='str', required=True)
+        datacenters=dict(type='list', elements='str', required=False, default=[]),
+        clusters=dict(type='list', elements='str', required=False, default=[]),
+        **CACHE_ARGUMENT_SPEC,
     )
 
     result = dict(
@@ -92,11 +107,19 @@ def main():
         module.params['username'],
         module.params['password'],
         module.params['disable_ssl_verification'],
+        **cache_options(module.params),
     )
-    networks = vcenter_facts.get_networks(
-        datacenters=module.params['datacenters'],
-        clusters=module.params['clusters'],
-    )
+    if module.params['force']:
+        vcenter_facts.invalidate_cache()
+    try:
+        networks = vcenter_facts.get_networks(
+            datacenters=module.params['datacenters'],
+            clusters=module.params['clusters'],
+        )
+    except Exception as e:
+        result['error'] = f"Failed to retrieve networks: {str(e)}"
+        module.fail_json(msg=result['error'])
+
     result['networks'] = networks
     module.exit_json(**result)
 
@@ -0,0 +1,178 @@
+#!/usr/bin/python
+
+DOCUMENTATION = '''
+---
+module: get_subnets
+version_added: 1.0.0
+short_description: Retrieve the Satellite subnet list through a local cache.
+description:
+  - This module returns the full Satellite subnet list, keeping a copy of it in a local cache file.
+  - While the cache is younger than C(ttl) seconds it is returned without contacting Satellite.
+  - Once it expires, a single one-record query fetches the subnet count and the most recent C(updated_at).
+    The list is only downloaded again when either of them changed.
+author:
+  - "Louis Tiches"
+options:
+  satellite_fqdn:
+    description: The hostname of the Satellite server.
+    required: true
+    type: str
+  username:
+    description: The username to use for authentication with the Satellite server.
+    required: true
+    type: str
+  password:
+    description: The password to use for authentication with the Satellite server.
+    required: true
+    type: str
+  validate_certs:
+    description: Whether to validate the SSL certificate of the Satellite server.
+    required: false
+    default: false
+    type: bool
+  cache_path:
+    description: The file the subnet list is cached in.
+    required: false
+    default: ~/.cache/ip_validation/subnets.json
+    type: path
+  ttl:
+    description: How many seconds the cached list is used before checking Satellite for changes.
+    required: false
+    default: 3600
+    type: int
+  per_page:
+    description: How many subnets to request per page when the list is downloaded.
+    required: false
+    default: 500
+    type: int
+  force:
+    description: Download the subnet list even if the cache is still valid.
+    required: false
+    default: false
+    type: bool
+'''
+
+EXAMPLES = '''
+- name: Get Satellite subnets
+  get_subnets:
+    satellite_fqdn: satellite.example.com
+    username: admin
+    password: password
+  register: satellite_subnets
+
+- name: Debug Satellite subnets
+  debug:
+    var: satellite_subnets.subnets
+'''
+
+import json
+import os
+import tempfile
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from satellite_helper import SatelliteApi
+
+SUBNETS_ENDPOINT = '/api/v2/subnets'
+
+
+def subnet_version(satellite):
+    """
+    Return the subnet count and the most recent updated_at, which change whenever a subnet
+    is created, updated or deleted.
+    """
+    data = satellite.get(SUBNETS_ENDPOINT, {'page': 1, 'per_page': 1, 'order': 'updated_at DESC'})
+    latest = data['results'][0].get('updated_at') if data['results'] else None
+    return {'total': data['subtotal'], 'updated_at': latest}
+
+
+def read_cache(path):
+    """
+    Return the cached subnet list, or None if there is no usable cache file.
+    """
+    try:
+        with open(path) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or not {'fetched_at', 'version', 'subnets'} <= set(cache):
+        return None
+    return cache
+
+
+def write_cache(path, cache):
+    """
+    Write the cache file. The file is replaced atomically so concurrent builds never read half of it.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.subnets-')
+    try:
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(cache, cache_file)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def main():
+    module_args = dict(
+        satellite_fqdn=dict(type='str', required=True),
+        username=dict(type='str', required=True),
+        password=dict(type='str', required=True, no_log=True),
+        validate_certs=dict(type='bool', default=False),
+        cache_path=dict(type='path', default='~/.cache/ip_validation/subnets.json'),
+        ttl=dict(type='int', default=3600),
+        per_page=dict(type='int', default=500),
+        force=dict(type='bool', default=False),
+    )
+
+    result = dict(
+        changed=False,
+        subnets=[],
+        source='',
+        error="",
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+
+    params = module.params
+    satellite = SatelliteApi(
+        params['satellite_fqdn'],
+        params['username'],
+        params['password'],
+        params['validate_certs'],
+    )
+    cache = None if params['force'] else read_cache(params['cache_path'])
+
+    try:
+        if cache and time.time() - cache['fetched_at'] < params['ttl']:
+            result['source'] = 'cache'
+        else:
+            version = subnet_version(satellite)
+            if cache and cache['version'] == version:
+                result['source'] = 'cache'
+            else:
+                subnets = satellite.get_all(SUBNETS_ENDPOINT, per_page=params['per_page'])
+                cache = {'version': version, 'subnets': subnets}
+                result['source'] = 'satellite'
+            cache['fetched_at'] = time.time()
+            if not module.check_mode:
+                try:
+                    write_cache(params['cache_path'], cache)
+                except OSError:
+                    # An unusable cache location shouldn't stop live lookups.
+                    pass
+    except Exception as e:
+        result['error'] = f"Failed to retrieve subnets: {str(e)}"
+        module.fail_json(msg=result['error'])
+
+    result['subnets'] = cache['subnets']
+    module.exit_json(**result)
+
+if __name__ == '__main__':
+    main()
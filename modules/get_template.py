@@ -8,6 +8,8 @@ short_description: Get a template in vCenter by name.
 description:
   - This module uses the vCenter API to retrieve a template by name.
   - Returns the full path of the template.
+  - If no template name is given, returns a dictionary mapping template names to their paths.
+  - Fails when several templates share a name, unless C(cluster) narrows them down to one.
 author:
   - "Louis Tiches"
 options:
@@ -28,10 +30,28 @@ options:
     required: false
     default: false
     type: bool
-  clusters:
-    description: A list of cluster names to filter by. If not specified, retrieves all clusters.
+  cluster:
+    description: The name of the cluster to filter by. If not specified, retrieves templates from all clusters.
     required: false
     type: str
+  template:
+    description: The name of the template to retrieve. If not specified, retrieves all templates.
+    required: false
+    type: str
+  cache_path:
+    description: The SQLite file the vCenter inventory is cached in. An empty value disables the cache.
+    required: false
+    default: ~/.cache/vm_facts/inventory.db
+    type: path
+  ttl:
+    description: How many seconds cached inventory is used before it is fetched from vCenter again. Defaults to a TTL per object type.
+    required: false
+    type: int
+  force:
+    description: Drop the cached inventory of this vCenter account and fetch it from vCenter again.
+    required: false
+    default: false
+    type: bool
 '''
 
 EXAMPLES = '''
@@ -41,6 +61,7 @@ EXAMPLES = '''
     username: admin
     password: password
     cluster: vcenter cluster
+    template: rhel8-template
   register: vcenter_template
 
 - name: Debug vCenter template path
@@ -49,7 +70,7 @@ EXAMPLES = '''
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from vcenter_helper import VcenterFacts
+from vcenter_helper import CACHE_ARGUMENT_SPEC, VcenterFacts, cache_options
 
 
 def main():
@@ -58,7 +79,9 @@ def main():
         username=dict(type='str', required=True),
         password=dict(type='str', required=True, no_log=True),
         disable_ssl_verification=dict(type='bool', default=False),
-        cluster=dict(type='str', required=True),
+        cluster=dict(type='str', required=False),
+        template=dict(type='str', required=False),
+        **CACHE_ARGUMENT_SPEC,
     )
 
     result = dict(
@@ -81,10 +104,19 @@ def main():
         module.params['username'],
         module.params['password'],
         module.params['disable_ssl_verification'],
+        **cache_options(module.params),
     )
-    template_path = vcenter_facts.get_template_path(
-        module.params['cluster']
-    )
+    if module.params['force']:
+        vcenter_facts.invalidate_cache()
+    try:
+        template_path = vcenter_facts.get_template_path(
+            module.params['cluster'],
+            module.params['template'],
+        )
+    except Exception as e:
+        result['error'] = f"Failed to retrieve template {module.params['template']}: {str(e)}"
+        module.fail_json(msg=result['error'])
+
     result['vcenter_template'] = template_path
     module.exit_json(**result)
 
@@ -1,7 +1,126 @@
 #!/usr/bin/python
   
+import bisect
+import hashlib
 import ipaddress
 from ansible.errors import AnsibleFilterError
+from ansible.utils.display import Display
+
+display = Display()
+
+# Compiled subnet indexes, keyed by a hash of the network list they were built from.
+_SUBNET_INDEXES = {}
+_SUBNET_INDEX_CACHE_SIZE = 16
+
+
+class SubnetIndex(object):
+    """
+    Longest-prefix-match index over IPv4 networks, kept as integer intervals sorted by start address.
+    CIDR blocks are either nested or disjoint, so each interval links to the closest interval containing it.
+    """
+    def __init__(self, entries):
+        """
+        Build the index from a list of (IPv4Network, value) tuples.
+        When the same network is listed more than once, the first value is kept.
+        """
+        self.starts = []
+        self.ends = []
+        self.parents = []
+        self.values = []
+
+        # Sort containing networks before the networks inside them
+        ordered = sorted(
+            entries,
+            key=lambda entry: (int(entry[0].network_address), -entry[0].num_addresses),
+        )
+        stack = []
+        for network, value in ordered:
+            start = int(network.network_address)
+            end = int(network.broadcast_address)
+            while stack and self.ends[stack[-1]] < start:
+                stack.pop()
+            if stack and self.starts[stack[-1]] == start and self.ends[stack[-1]] == end:
+                continue
+
+            self.starts.append(start)
+            self.ends.append(end)
+            self.parents.append(stack[-1] if stack else -1)
+            self.values.append(value)
+            stack.append(len(self.starts) - 1)
+
+    def lookup(self, ip):
+        """
+        Return the value of the most specific network containing the IPv4 address, or None.
+        """
+        i = self.locate(ip)
+        if i < 0:
+            return None
+        return self.values[i]
+
+    def locate(self, ip):
+        """
+        Return the position of the most specific network containing the IPv4 address, or -1.
+        """
+        ip = int(ip)
+        i = bisect.bisect_right(self.starts, ip) - 1
+        while i >= 0:
+            if ip <= self.ends[i]:
+                return i
+            i = self.parents[i]
+        return -1
+
+
+class AddressBitmap(object):
+    """
+    Allocation bitmap over the addresses of an IPv4 network, kept in a single Python int where bit i
+    is set when the network address + i is taken. Free addresses are found with big-int bit operations,
+    which work a machine word at a time instead of an address at a time.
+    """
+    def __init__(self, network, first=None, last=None):
+        """
+        Build the bitmap for an IPv4Network. The network and broadcast addresses are taken, as are the
+        addresses outside the first-last range when one is given.
+        """
+        self.network = network
+        self.start = int(network.network_address)
+        self.size = network.num_addresses
+        self.bits = 0
+        if self.size > 2:
+            self.claim(network.network_address)
+            self.claim(network.broadcast_address)
+        if first is not None:
+            self.bits |= (1 << max(int(first) - self.start, 0)) - 1
+        if last is not None:
+            keep = (1 << max(int(last) - self.start + 1, 0)) - 1
+            self.bits |= ((1 << self.size) - 1) & ~keep
+
+    def claim(self, ip):
+        """
+        Mark an IPv4 address as taken. Addresses outside the network are ignored.
+        """
+        offset = int(ip) - self.start
+        if 0 <= offset < self.size:
+            self.bits |= 1 << offset
+
+    def free(self, count=1):
+        """
+        Return up to count free addresses, lowest first. The bitmap itself is left unchanged.
+        The free bits are inverted and split into 64-bit words once, in O(size / word size), so each
+        address after that only pops the lowest set bit of a small word instead of touching the whole bitmap.
+        """
+        free = ~self.bits & ((1 << self.size) - 1)
+        data = free.to_bytes((self.size + 63) // 64 * 8, 'little')
+        addresses = []
+        for i in range(0, len(data), 8):
+            word = int.from_bytes(data[i:i + 8], 'little')
+            while word and len(addresses) < count:
+                lowest = word & -word
+                addresses.append(ipaddress.IPv4Address(self.start + i * 8 + lowest.bit_length() - 1))
+                word ^= lowest
+            if len(addresses) >= count:
+                break
+        return addresses
+
 
 class FilterModule(object):
     def filters(self):
@@ -9,7 +128,10 @@ class FilterModule(object):
             'network_validation': self.network_validation,
             'validate_ip':       self.validate_ip,
             'get_subnet_info':   self.get_subnet_info,
-            'match_network':     self.match_network
+            'match_network':     self.match_network,
+            'resolve_subnet':    self.resolve_subnet,
+            'validate_ips':      self.validate_ips,
+            'free_ips':          self.free_ips
         }
     
     def get_subnet_info(self, subnet_data):
@@ -75,27 +197,177 @@ class FilterModule(object):
     
     def match_network(self, ip_address, network_list):
         """
-        This filter returns the network address if the provided IP address is in the given network list,
-        otherwise False
+        This filter returns the most specific network containing the provided IP address from the
+        given network list, otherwise False
         """
         try:
             ip = ipaddress.IPv4Address(ip_address)
         except ipaddress.AddressValueError:
             raise AnsibleFilterError(f"Invalid IP address: {ip_address}")
 
+        network = self._network_index(network_list).lookup(ip)
+        if network is None:
+            return False
+        return network
+
+    def _network_index(self, network_list):
+        """
+        Returns the SubnetIndex for a list of "<network>/<cidr>" strings, compiling it only the first
+        time that list content is seen.
+        """
+        key = hashlib.sha1("\n".join(network_list).encode()).hexdigest()
+        index = _SUBNET_INDEXES.get(key)
+        if index is not None:
+            return index
+
+        entries = []
         for network_address in network_list:
-            network_parts = network_address.split('/')
-            if len(network_parts) != 2:
+            if len(network_address.split('/')) != 2:
                 raise AnsibleFilterError(f"Network address {network_address} is missing the netmask")
 
-            network_ip = network_parts[0]
             try:
                 network = ipaddress.IPv4Network(network_address)
             except ipaddress.AddressValueError:
                 print(f"Invalid network address: {network_address}")
                 continue
+            entries.append((network, str(network)))
 
-            if ip in network:
-                return str(network)
+        return self._cache_index(key, SubnetIndex(entries))
 
-        return False
\ No newline at end of file
+    def resolve_subnet(self, ip_address, subnet_data):
+        """
+        This filter returns the Satellite subnet record of the most specific subnet containing the provided
+        IP address, with its "vc,dc,cluster,vlan" description split into vcenter, datacenter, cluster and vlan,
+        otherwise False
+        """
+        try:
+            ip = ipaddress.IPv4Address(ip_address)
+        except ipaddress.AddressValueError:
+            raise AnsibleFilterError(f"Invalid IP address: {ip_address}")
+
+        subnet = self._subnet_index(subnet_data).lookup(ip)
+        if subnet is None:
+            return False
+
+        description = (subnet.get('description') or '').split(',')
+        description += [None] * (4 - len(description))
+        result = dict(subnet)
+        result.setdefault('network_address', f"{subnet['network']}/{subnet['cidr']}")
+        result['vcenter'], result['datacenter'], result['cluster'], result['vlan'] = description[:4]
+        return result
+
+    def validate_ips(self, ip_list, subnet_data):
+        """
+        This filter checks a list of IP addresses against the Satellite subnet list at once. It returns one
+        dictionary per address with the ip, the network address of its subnet, whether it is valid and, if not,
+        the reason: not a valid IP, no subnet, network, broadcast or gateway address, or listed twice
+        """
+        index = self._subnet_index(subnet_data)
+        gateways = {}
+        seen = set()
+        results = []
+        for ip_address in ip_list:
+            reason = None
+            network_address = None
+            ip = self.validate_ip(ip_address)
+            position = index.locate(ip) if ip else -1
+            if position >= 0:
+                subnet = index.values[position]
+                network_address = subnet.get('network_address') or f"{subnet['network']}/{subnet['cidr']}"
+                # Each subnet's gateway is parsed once, however many IPs fall in it
+                if position not in gateways:
+                    gateways[position] = self.validate_ip(subnet.get('gateway'))
+
+            if not ip:
+                reason = "is not a valid IP address"
+            elif position < 0:
+                reason = "is not in any subnet"
+            elif int(ip) == index.starts[position]:
+                reason = "is the network address"
+            elif int(ip) == index.ends[position]:
+                reason = "is the broadcast address"
+            elif ip == gateways[position]:
+                reason = "is the gateway address"
+            elif ip in seen:
+                reason = "is listed more than once"
+            if ip:
+                seen.add(ip)
+
+            results.append({
+                'ip': ip_address,
+                'network_address': network_address,
+                'valid': reason is None,
+                'reason': reason,
+            })
+        return results
+
+    def free_ips(self, subnet, claimed_ips, count=1):
+        """
+        This filter returns a list of the first count free IP addresses in a subnet, given as "<network>/<cidr>"
+        or as a Satellite subnet record, skipping the claimed IP addresses. For Satellite records, the gateway
+        is skipped and the from/to IPAM range is honoured when set
+        """
+        first = last = None
+        gateway = None
+        if isinstance(subnet, dict):
+            network_address = f"{subnet['network']}/{subnet['cidr']}"
+            first = self.validate_ip(subnet.get('from'))
+            last = self.validate_ip(subnet.get('to'))
+            gateway = self.validate_ip(subnet.get('gateway'))
+        else:
+            network_address = subnet
+        if '/' not in network_address:
+            raise AnsibleFilterError(f"Network address {network_address} is missing the netmask")
+
+        try:
+            network = ipaddress.IPv4Network(network_address)
+        except ValueError:
+            raise AnsibleFilterError(f"Invalid network address: {network_address}")
+
+        bitmap = AddressBitmap(network, first or None, last or None)
+        if gateway:
+            bitmap.claim(gateway)
+        for ip_address in claimed_ips:
+            ip = self.validate_ip(ip_address)
+            if ip:
+                bitmap.claim(ip)
+        return [str(ip) for ip in bitmap.free(int(count))]
+
+    def _subnet_index(self, subnet_data):
+        """
+        Returns the SubnetIndex for a list of Satellite subnet records. The index is cached under the
+        id, network, cidr and updated_at of every record, since Satellite bumps updated_at on any change.
+        Lists with records lacking updated_at are indexed without caching.
+        """
+        key = None
+        if all('updated_at' in subnet for subnet in subnet_data):
+            key = tuple(
+                (subnet.get('id'), subnet['network'], subnet['cidr'], subnet['updated_at'])
+                for subnet in subnet_data
+            )
+            index = _SUBNET_INDEXES.get(key)
+            if index is not None:
+                return index
+
+        entries = []
+        for subnet in subnet_data:
+            try:
+                network = ipaddress.IPv4Network(f"{subnet['network']}/{subnet['cidr']}")
+            except ValueError:
+                display.warning(f"Skipping invalid Satellite subnet: {subnet['network']}/{subnet['cidr']}")
+                continue
+            entries.append((network, subnet))
+
+        index = SubnetIndex(entries)
+        if key is None:
+            return index
+        return self._cache_index(key, index)
+
+    def _cache_index(self, key, index):
+        """
+        Stores a compiled index, evicting the oldest one once the cache is full.
+        """
+        if len(_SUBNET_INDEXES) >= _SUBNET_INDEX_CACHE_SIZE:
+            _SUBNET_INDEXES.pop(next(iter(_SUBNET_INDEXES)))
+        _SUBNET_INDEXES[key] = index
+        return index
@@ -1,160 +1,208 @@
+from concurrent.futures import ThreadPoolExecutor
 from pyVim.connect import SmartConnect, Disconnect
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
+from requests.adapters import HTTPAdapter
+import argparse
+import json
+import os
 import ssl
+import sys
+import time
 import requests
 import yaml
 
-def get_hosts_by_domain(domain):
+def paginate(endpoint, params=None, per_page=None):
     """
-    Retrieves a list of hosts in Foreman that match a specified domain name.
+    Streams the results of a paginated Foreman API endpoint one page at a time, so that
+    processing starts on the first page and only one page is held in memory.
+
+    Parameters:
+    - endpoint (str): The API endpoint to retrieve results from.
+    - params (dict): Optional query parameters to pass to the API.
+    - per_page (int): Optional number of results to request per page.
+
+    Returns:
+    - A generator of result dictionaries. For endpoints that return results keyed by host,
+      such as fact values, a generator of (host, values) tuples.
+    """
+
+    params = dict(params or {})
+    params["per_page"] = per_page or page_size
+    params["page"] = 1
+    while True:
+        response = session.get(f"{foreman_url}{endpoint}", params=params)
+        response.raise_for_status()
+        data = response.json()
+        results = data["results"]
+        if isinstance(results, dict):
+            yield from results.items()
+        else:
+            yield from results
+
+        if not results or params["page"] * params["per_page"] >= data.get("subtotal", 0):
+            break
+        params["page"] += 1
+
+def get_hosts_by_domain(domain, per_page=None):
+    """
+    Retrieves the hosts in Foreman that match a specified domain name, following every page of results.
 
     Parameters:
     - domain (str): The domain name to search for.
+    - per_page (int): Optional number of hosts to request per page.
 
     Returns:
-    - A list of host dictionaries, or an empty list if no hosts are found.
+    - A generator of host dictionaries with the "id" and "name" of each host.
     """
 
-    lis = []
     params = {
         "search": f"name~{domain}",
         "thin": 1,
     }
-    response = requests.get(
-        f"{foreman_url}/api/hosts",
-        params=params,
-        auth=(username, password),
-        verify=False  # Disable SSL certificate verification
-    )
-    response.raise_for_status()
-    data = response.json()["results"]
-    for x in data:
-        lis.append(x['name'])
-    return lis
+    for x in paginate("/api/hosts", params, per_page):
+        yield {"id": x["id"], "name": x["name"]}
 
-def host_facts(host_id,host,params=None):
+def host_facts(host_names, per_page=None):
     """
-    Retrieves the Ansible network facts for a specified host in Foreman.
+    Retrieves the Ansible network and DNS facts for a batch of hosts in Foreman with
+    one fact values query, instead of two facts queries per host.
 
     Parameters:
-    - host_id (int): The ID of the host to retrieve facts for.
-    - host (str): The hostname or FQDN of the host.
-    - params (dict): Optional query parameters to pass to the API.
+    - host_names (list): The hostnames or FQDNs of the hosts.
+    - per_page (int): Optional number of fact values to retrieve per page.
 
     Returns:
-    - A list of network fact dictionaries.
+    - A dictionary mapping each hostname to a dictionary of its network and DNS facts.
     """
 
-    if params is None:
-        params = default_params
+    hosts_search = " or ".join(f"host = {name}" for name in host_names)
+    params = {
+        "search": f"({hosts_search}) and ({fact_search})",
+    }
+
+    facts = {}
+    for host, values in paginate("/api/fact_values", params, per_page):
+        facts.setdefault(host, {}).update(values)
 
-    response = requests.get(
-        f"{foreman_url}/api/hosts/{host_id}/facts",
-        params=params,
-        auth=(username, password),
-        verify=False  # Disable SSL certificate verification
-    )
-    response.raise_for_status()
-    data = response.json()['results']
-        
-    return data 
+    return facts
 
-def grab_facts(endpoint,params=None):
+def get_subnets(per_page=None):
     """
-    Retrieves a list of facts from Foreman.
+    Retrieves every existing subnet in Foreman, following every page of results.
 
     Parameters:
-    - endpoint (str): The API endpoint to retrieve facts from.
-    - params (dict): Optional query parameters to pass to the API.
+    - per_page (int): Optional number of subnets to request per page.
 
     Returns:
-    - A list of fact dictionaries.
+    - A dictionary mapping each subnet network address to its subnet dictionary.
     """
 
-    if params is None:
-        params = default_params
-    response = requests.get(
-        f"{foreman_url}{endpoint}",
-        params=params,
-        auth=(username, password),
-        verify=False  # Disable SSL certificate verification
-    )
-    response.raise_for_status()
-    data = response.json()['results']
-    if len(data) == 0:
-        return None
-    else:
-        return data[0]
+    return {x["network"]: x for x in paginate(subnets_endpoint, per_page=per_page)}
 
-def create_subnet(name, network, description, mask, gw, dns1, dns2):
+def create_subnet(subnet):
     """
     Creates a new subnet in Foreman.
 
+    Parameters:
+    - subnet (dict): The subnet fields, as built by build_subnets.
+
     Returns:
     - The subnet dictionary for the newly created subnet.
     """
 
-    desc = ",".join(description)
     data = {
-        "subnet": {
-            "description": desc,
-            "name":    name,
-            "network": network,
-            "mask":    mask,
-            "gateway": gw,
-            "dns_primary":   dns1,
-            "dns_secondary": dns2,
-            "dhcp":      None,
-            "boot_mode": None,
-            "vlanid":    None,
-        }
+        "subnet": dict(subnet, dhcp=None, boot_mode=None, vlanid=None)
     }
 
-    response = requests.post(
+    response = session.post(
         f"{foreman_url}{subnets_endpoint}",
         data=json.dumps(data),
         headers={'Content-Type': 'application/json'},
-        auth=(username, password),
-        verify=False  # Disable SSL certificate verification
     )
     response.raise_for_status()
 
     return response.json()['subnet']
 
-def update_subnet(name, network, desc, mask, gw, dns1, dns2):
+def update_subnet(subnet_id, subnet):
     """
     Updates an existing subnet in Foreman.
 
+    Parameters:
+    - subnet_id (int): The ID of the subnet to update.
+    - subnet (dict): The subnet fields, as built by build_subnets.
+
     Returns:
     - The subnet dictionary for the updated subnet.
     """
 
     data = {
-        "subnet": {
-            "description": desc,
-            "name":    name,
-            "network": network,
-            "mask":    mask,
-            "gateway": gw,   
-            "dns_primary":   dns1, 
-            "dns_secondary": dns2,
-            "dhcp":      None,  
-            "boot_mode": None, 
-            "vlanid":    None,
-        }
+        "subnet": dict(subnet, dhcp=None, boot_mode=None, vlanid=None)
     }
 
-    response = requests.put(
+    response = session.put(
         f"{foreman_url}{subnets_endpoint}/{subnet_id}",
         data=json.dumps(data),
         headers={'Content-Type': 'application/json'},
-        auth=(username, password),
-        verify=False  # Disable SSL certificate verification
     )
     response.raise_for_status()
 
     return response.json()['subnet']
 
+def build_subnets(records):
+    """
+    Builds the desired subnet fields for each network from the collected network facts.
+
+    Parameters:
+    - records (list): Network facts dictionaries, ranked by sort_dicts. When several records
+      share a network, the last one wins.
+
+    Returns:
+    - A dictionary mapping each network address to its subnet fields.
+    """
+
+    subnets = {}
+    for record in records:
+        subnets[record['network']] = {
+            "name":          record['network'],
+            "network":       record['network'],
+            "mask":          record['subnet'],
+            "gateway":       record['gw'],
+            "dns_primary":   record['dns1'],
+            "dns_secondary": record['dns2'],
+            "description":   f"{record['vcenter']},{record['datacenter']},{record['cluster']},{record['vlan']}",
+        }
+    return subnets
+
+def diff_subnets(desired, existing):
+    """
+    Compares the desired subnets with the subnets already in Foreman.
+
+    Parameters:
+    - desired (dict): The desired subnet fields by network address, from build_subnets.
+    - existing (dict): The existing subnets by network address, from get_subnets.
+
+    Returns:
+    - A (creates, updates, unchanged) tuple. creates is a list of subnet fields, updates is a
+      list of (subnet ID, subnet fields, changed field names) tuples and unchanged is a count.
+    """
+
+    creates = []
+    updates = []
+    unchanged = 0
+    for network, subnet in desired.items():
+        current = existing.get(network)
+        if current is None:
+            creates.append(subnet)
+            continue
+
+        changed = [field for field, value in subnet.items() if current.get(field) != value]
+        if changed:
+            updates.append((current['id'], subnet, changed))
+        else:
+            unchanged += 1
+
+    return creates, updates, unchanged
+
 def connect_vcenter(vcenter, vc_username, vc_password, verify=True):
     """
     Connects to a vCenter server using the specified credentials.
@@ -184,145 +232,216 @@ def connect_vcenter(vcenter, vc_username, vc_password, verify=True):
 
     return si
 
-def get_vm_details(si, vm_name):
+def build_vm_index(si, page_size=1000):
     """
-    Searches for virtual machine facts
+    Builds an index of every virtual machine in vCenter with one bulk property fetch,
+    instead of searching the inventory and reading VM properties for every host.
 
     Parameters:
     - si: A ServiceInstance object representing the connection to the vCenter server.
-    - vm_name: The name of the virtual machine to retrieve details for.
+    - page_size (int): The number of objects to retrieve per RetrievePropertiesEx call.
 
     Returns:
-    - Returns a dictionary containing the name, cluster, and network of the virtual machine.
+    - A dictionary mapping each VM name to a dictionary containing its datacenter, cluster, network,
+      and networks_by_ip. network is the backing network of the VM's first NIC, and networks_by_ip
+      maps each IP address reported by VMware Tools to the network of the NIC holding it.
     """
 
-    vm = None
     content = si.RetrieveContent()
-    for child in content.rootFolder.childEntity:
-        if hasattr(child, 'vmFolder'):
-            vm_folder = child.vmFolder
-            vm = vm_folder.find(vm_name)
-            if vm is not None:
+    property_specs = [
+        (vim.VirtualMachine, ["name", "parent", "runtime.host", "config.hardware.device", "guest.net"]),
+        (vim.HostSystem, ["parent"]),
+        (vim.ComputeResource, ["name"]),
+        (vim.Network, ["name"]),
+        (vim.dvs.DistributedVirtualPortgroup, ["name", "key"]),
+        (vim.Folder, ["parent"]),
+        (vim.Datacenter, ["name"]),
+    ]
+    view = content.viewManager.CreateContainerView(
+        content.rootFolder, [obj_type for obj_type, _ in property_specs], True
+    )
+    try:
+        traversal_spec = vmodl.query.PropertyCollector.TraversalSpec(
+            name="traverseView", path="view", skip=False, type=vim.view.ContainerView
+        )
+        object_spec = vmodl.query.PropertyCollector.ObjectSpec(
+            obj=view, skip=True, selectSet=[traversal_spec]
+        )
+        prop_specs = [
+            vmodl.query.PropertyCollector.PropertySpec(type=obj_type, pathSet=paths, all=False)
+            for obj_type, paths in property_specs
+        ]
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=[object_spec], propSet=prop_specs)
+        options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=page_size)
+
+        collector = content.propertyCollector
+        objects = {}
+        result = collector.RetrievePropertiesEx([filter_spec], options)
+        while result:
+            for obj_content in result.objects:
+                props = {prop.name: prop.val for prop in obj_content.propSet}
+                objects[obj_content.obj._moId] = (obj_content.obj, props)
+            if not result.token:
                 break
+            result = collector.ContinueRetrievePropertiesEx(result.token)
+    finally:
+        view.Destroy()
 
-    if vm is None:
-        return None
+    def props_of(obj):
+        return objects.get(obj._moId, (None, {}))[1] if obj is not None else {}
 
-    host_system = vm.summary.runtime.host
-    cluster_compute_resource = host_system.parent
-    cluster_name = cluster_compute_resource.name
-    network_name = None
-    for device in vm.config.hardware.device:
-        if isinstance(device, vim.vm.device.VirtualEthernetCard):
-            network_name = device.deviceInfo.summary
-            break
+    portgroups = {
+        props["key"]: props.get("name")
+        for obj, props in objects.values()
+        if isinstance(obj, vim.dvs.DistributedVirtualPortgroup) and "key" in props
+    }
 
-    if network_name is not None:
-        datacenter = vm.parent.parent.name
-        return {"datacenter": datacenter, "cluster": cluster_name, "network": network_name}
-    else:
-        return None
+    def backing_network(nic):
+        backing = nic.backing
+        if isinstance(backing, vim.vm.device.VirtualEthernetCard.NetworkBackingInfo) and backing.network is not None:
+            return props_of(backing.network).get("name")
+        if isinstance(backing, vim.vm.device.VirtualEthernetCard.DistributedVirtualPortBackingInfo):
+            return portgroups.get(backing.port.portgroupKey)
+        return nic.deviceInfo.summary if nic.deviceInfo else None
+
+    vm_index = {}
+    for obj, props in objects.values():
+        if not isinstance(obj, vim.VirtualMachine) or props.get("name") in vm_index:
+            continue
+
+        # The VM's network is the backing network of its first NIC, as the VM property
+        # "network" is an unordered set that can't tell the NICs of multi-NIC VMs apart
+        network_name = None
+        for device in props.get("config.hardware.device") or []:
+            if isinstance(device, vim.vm.device.VirtualEthernetCard):
+                network_name = backing_network(device)
+                break
 
+        networks_by_ip = {}
+        for nic in props.get("guest.net") or []:
+            for ip in nic.ipAddress or []:
+                networks_by_ip.setdefault(ip, nic.network)
 
-def sort_dicts(dicts):
+        host_system = props.get("runtime.host")
+        cluster_compute_resource = props_of(host_system).get("parent")
+        cluster_name = props_of(cluster_compute_resource).get("name")
+
+        datacenter = props.get("parent")
+        while datacenter is not None and not isinstance(datacenter, vim.Datacenter):
+            datacenter = props_of(datacenter).get("parent")
+
+        if network_name is not None or networks_by_ip:
+            vm_index[props["name"]] = {
+                "datacenter": props_of(datacenter).get("name"),
+                "cluster": cluster_name,
+                "network": network_name,
+                "networks_by_ip": networks_by_ip,
+            }
+
+    return vm_index
+
+def index_vcenter(vcenter):
     """
-    Sort the list of dictionaries by the number of key-value pair matches.
+    Connects to one vCenter server with its own session and indexes its virtual machines.
+
+    Parameters:
+    - vcenter (str): The hostname of the vCenter server.
 
     Returns:
-    - A list of sorted dictionaries.
+    - The VM index built by build_vm_index, with the vCenter name added to each VM.
+
+    Raises:
+    - Exception: If the connection failed. Carrying on would record every host of that vCenter
+      as skipped in the checkpoint, and reruns would not collect them again until they expire.
     """
-    count_dict = {}
-    # Count occurrences of each dictionary
-    for d1 in dicts:
-        d1_tuple = tuple(sorted(d1.items()))
-        for d2 in dicts:
-            if d1 != d2:
-                count = sum(1 for k, v in d1.items() if k in d2 and d2[k] == v)
-                if d1_tuple not in count_dict:
-                    count_dict[d1_tuple] = count
-                else:
-                    count_dict[d1_tuple] += count
 
-    # Sort the dictionaries by count
-    sorted_dicts = sorted(dicts, key=lambda d: count_dict[tuple(sorted(d.items()))], reverse=False)
-    return sorted_dicts
+    si = connect_vcenter(vcenter, vc_username, vc_password)
+    if si is None:
+        raise Exception(f"Could not index vCenter server {vcenter}")
 
+    try:
+        vm_index = build_vm_index(si)
+    finally:
+        Disconnect(si)
 
+    for details in vm_index.values():
+        details["vcenter"] = vcenter
+    return vm_index
 
-with open("/root/.hammer/cli.modules.d/foreman.yml", "r") as s:
-    config = yaml.safe_load(s)
+def build_vm_indexes(vcenters):
+    """
+    Indexes the virtual machines of several vCenter servers concurrently, one worker per vCenter.
 
-username = config[':foreman'][':username']
-password = config[':foreman'][':password']
-foreman_url = 'https://sat.example.net'
+    Parameters:
+    - vcenters (list): The hostnames of the vCenter servers.
 
-with open("/home/$USER/.vcenter", "r") as v:
-    config = yaml.safe_load(v)
-vc_username = config['vcenter']['username']
-vc_password = config['vcenter']['password']
+    Returns:
+    - A dictionary mapping each VM name to a dictionary containing its vcenter, datacenter,
+      cluster, and network. A VM name found in several vCenters keeps the first vCenter listed.
+    """
 
-s.close()
-v.close()
+    merged = {}
+    with ThreadPoolExecutor(max_workers=max(len(vcenters), 1)) as executor:
+        for vm_index in executor.map(index_vcenter, vcenters):
+            for name, details in vm_index.items():
+                merged.setdefault(name, details)
+    return merged
 
-# Set the API endpoints and query parameters
-net_params = {
-    "search": "ansible_default_ipv4",  # Set the search filter to retrieve only the ansible_default_ipv4 fact
-    "per_page": 9000,  # Set the number of facts to retrieve per page
-}
-dns_params = {
-    "search": "ansible_dns",  # Set the search filter to retrieve only the ansible_dns facts
-    "per_page": 9000,  # Set the number of facts to retrieve per page
-}
+def get_vm_details(vm_index, vm_name, ip=None):
+    """
+    Searches for virtual machine facts
 
-default_params = {
-    "per_page": 9000,
-}
+    Parameters:
+    - vm_index: The VM index built by build_vm_indexes.
+    - vm_name: The name of the virtual machine to retrieve details for.
+    - ip (str): The VM's address. When VMware Tools reports it, the network of the NIC holding it
+      is returned instead of the network of the first NIC.
 
-# Create a list to store the network facts for each host
-network_facts = []
-temp_list = []
-no_facts =  []
-no_dns =  []
-no_net =  []
-subnets = []
+    Returns:
+    - Returns a dictionary containing the vcenter, datacenter, cluster, and network of the virtual machine.
+    """
+
+    vm_details = vm_index.get(vm_name)
+    if vm_details is None:
+        return None
+
+    network_name = vm_details["networks_by_ip"].get(ip) or vm_details["network"]
+    if network_name is None:
+        return None
+    return {
+        "vcenter": vm_details["vcenter"],
+        "datacenter": vm_details["datacenter"],
+        "cluster": vm_details["cluster"],
+        "network": network_name,
+    }
 
-# Retrieve the host ID for each host using the Satellite API
-hosts = get_hosts_by_domain('example.net')
 
-# Connect to the vCenter server
-si = connect_vcenter(vcenter, vc_username, vc_password)
+def collect_host(host, facts):
+    """
+    Checks the network and DNS facts of a single host and adds its vCenter facts.
 
-for host in hosts:
-    # grab host_id
-    host_id = grab_facts(f"/api/hosts?search=name={host}")
-    if host_id is None:
-        no_facts.append(host)
-        continue
-    host_id = host_id['id']
+    Parameters:
+    - host (dict): The "id" and "name" of the host, as returned by get_hosts_by_domain.
+    - facts (dict): The network and DNS facts of the host, as returned by host_facts, or None.
 
-    # Retrieve the Ansible network facts for the host using the Satellite API
-    r = host_facts(host_id,host,net_params)
-    try:
-        net = r[host]
-    except KeyError:
-        continue
+    Returns:
+    - A (status, host, record) tuple, with the host name. status is "ok", "no_facts", "no_net", "no_dns" or "skipped",
+      and record is the network facts dictionary when status is "ok".
+    """
+
+    host = host['name']
+    if not facts:
+        return "no_facts", host, None
 
     if (
-        "ansible_default_ipv4::address" not in net or
-        "ansible_default_ipv4::netmask" not in net or
-        "ansible_default_ipv4::gateway" not in net
+        "ansible_default_ipv4::address" not in facts or
+        "ansible_default_ipv4::netmask" not in facts or
+        "ansible_default_ipv4::gateway" not in facts
     ):
         print(f"Skipping host {host}: missing network facts")
-        no_net.append(host)
-        continue
-
-    # Retrieve the Ansible dns facts for the host using the Satellite API
-    r = host_facts(host_id,host,dns_params)
-    try:
-        dns = r[host]
-    except KeyError:
-        continue
+        return "no_net", host, None
 
+    dns = dict(facts)
     if "ansible_dns::nameservers" in dns:
         value = dns["ansible_dns::nameservers"]
         if isinstance(value, str):
@@ -333,43 +452,201 @@ for host in hosts:
         len(dns["ansible_dns::nameservers"]) <= 1
     ):
         print(f"Skipping host {host}: missing dns facts")
-        no_dns.append(host)
-        continue
-    dns.update(net)
-
-    vm_details = get_vm_details(si, host)
-    if vm_details is not None:
-        
-        # Add the network facts to the network_facts list
-        network_facts.append({
-            "network":   dns["ansible_default_ipv4::network"],
-            "subnet": dns["ansible_default_ipv4::netmask"],
-            "gw":     dns["ansible_default_ipv4::gateway"],
-            "dns1":   dns["ansible_dns::nameservers"][0],
-            "dns2":   dns["ansible_dns::nameservers"][1],
-            "vlan":       vm_details['network'],
-            "cluster":    vm_details['cluster'],
-            "datacenter": vm_details['datacenter'],
-            "vcenter": vcenter
-            })
-
-Disconnect(si)
-res = sort_dicts(subnets)
-for subnet in res:
-    name = subnet['network']
-    network = subnet['network']
-    mask = subnet['subnet']
-    gw =   subnet['gw']
-    dns1 = subnet['dns1']
-    dns2 = subnet['dns2']
-    vlan = subnet['vlan']
-    dc = subnet['datacenter']
-    vc = vcenter
-    cluster = subnet['cluster']
-    description = f"{vc},{dc},{cluster},{vlan}"
-    subnet_check = grab_facts(f"/api/subnets?search=network={subnet['name']}")
-    if subnet_checks is not None:
-        subnet_id = subnet_check['id']
-        update_subnet(name,network,description,mask,gw,dns1,dns2)
-    else:
-        create_subnet(name,network,description,mask,gw,dns1,dns2)
+        return "no_dns", host, None
+
+    vm_details = get_vm_details(vm_index, host, dns["ansible_default_ipv4::address"])
+    if vm_details is None:
+        return "skipped", host, None
+
+    return "ok", host, {
+        "network":   dns["ansible_default_ipv4::network"],
+        "subnet": dns["ansible_default_ipv4::netmask"],
+        "gw":     dns["ansible_default_ipv4::gateway"],
+        "dns1":   dns["ansible_dns::nameservers"][0],
+        "dns2":   dns["ansible_dns::nameservers"][1],
+        "vlan":       vm_details['network'],
+        "cluster":    vm_details['cluster'],
+        "datacenter": vm_details['datacenter'],
+        "vcenter": vm_details['vcenter']
+        }
+
+def load_checkpoint(path, max_age):
+    """
+    Loads the per-host results recorded by earlier runs.
+
+    Parameters:
+    - path (str): The checkpoint file, one JSON entry per line.
+    - max_age (float): The age in seconds after which an entry is collected again.
+
+    Returns:
+    - A dictionary mapping each hostname to its most recent checkpoint entry that is younger than max_age.
+    """
+
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+
+    oldest = time.time() - max_age
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            if entry["time"] >= oldest:
+                entries[entry["host"]] = entry
+            else:
+                entries.pop(entry["host"], None)
+    return entries
+
+def write_checkpoint(checkpoint, host, status, record):
+    """
+    Appends the result for one host to the checkpoint file.
+
+    Parameters:
+    - checkpoint: The open checkpoint file.
+    - host (str): The hostname or FQDN of the host.
+    - status (str): The status returned by collect_host.
+    - record (dict): The network facts dictionary returned by collect_host, or None.
+    """
+
+    checkpoint.write(json.dumps({"host": host, "status": status, "record": record, "time": time.time()}) + "\n")
+    checkpoint.flush()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Map Satellite hosts to their vCenter cluster and VLAN and record the results as Satellite subnets.")
+    parser.add_argument('--vcenter', action='append', help="vCenter server to map VMs from, repeat for several vCenters (defaults to the hosts listed in ~/.vcenter): --vcenter vc01.example.net")
+    parser.add_argument('--per-page', type=int, default=500, help="Number of results to request per Satellite API page: --per-page 500")
+    parser.add_argument('--workers', type=int, default=16, help="Number of fact queries to run concurrently: --workers 16")
+    parser.add_argument('--fact-batch', type=int, default=50, help="Number of hosts whose facts are fetched with one query: --fact-batch 50")
+    parser.add_argument('--write-workers', type=int, default=4, help="Number of subnet creates and updates to send concurrently: --write-workers 4")
+    parser.add_argument('--dry-run', action='store_true', help="Print the subnet changes without applying them: --dry-run")
+    parser.add_argument('--checkpoint', default=os.path.expanduser('~/.vlan_mapping/checkpoint.jsonl'), help="File recording per-host results so that reruns skip finished hosts: --checkpoint /tmp/vlan_mapping.jsonl")
+    parser.add_argument('--max-age', type=float, default=24, help="Age in hours after which a checkpointed host is collected again: --max-age 24")
+    return parser.parse_args()
+
+
+def sort_dicts(dicts):
+    """
+    Sort the list of dictionaries by the number of key-value pair matches.
+
+    Each dictionary is scored by how many of its key-value pairs appear in the other,
+    different dictionaries, counted in one pass over per-pair frequencies rather than
+    by comparing every pair of dictionaries.
+
+    Returns:
+    - A list of sorted dictionaries.
+    """
+    pair_counts = {}
+    dict_counts = {}
+    for d in dicts:
+        key = frozenset(d.items())
+        dict_counts[key] = dict_counts.get(key, 0) + 1
+        for pair in d.items():
+            pair_counts[pair] = pair_counts.get(pair, 0) + 1
+
+    scores = []
+    for d in dicts:
+        copies = dict_counts[frozenset(d.items())]
+        # Matches against identical dictionaries, including d itself, don't count
+        matches = sum(pair_counts[pair] for pair in d.items()) - copies * len(d)
+        # Every copy of a dictionary adds its matches to the same score
+        scores.append(copies * matches)
+
+    order = sorted(range(len(dicts)), key=lambda i: scores[i])
+    return [dicts[i] for i in order]
+
+
+with open("/root/.hammer/cli.modules.d/foreman.yml", "r") as s:
+    config = yaml.safe_load(s)
+
+username = config[':foreman'][':username']
+password = config[':foreman'][':password']
+foreman_url = 'https://sat.example.net'
+subnets_endpoint = '/api/subnets'
+
+with open("/home/$USER/.vcenter", "r") as v:
+    config = yaml.safe_load(v)
+vc_username = config['vcenter']['username']
+vc_password = config['vcenter']['password']
+vcenter_hosts = config['vcenter'].get('hosts', [])
+
+s.close()
+v.close()
+
+# Set the API endpoints and query parameters
+# Retrieve only the ansible_default_ipv4 and ansible_dns facts
+fact_search = "fact ~ ansible_default_ipv4 or fact ~ ansible_dns"
+
+# Create a list to store the network facts for each host
+network_facts = []
+no_facts =  []
+no_dns =  []
+no_net =  []
+skipped = []
+
+args = parse_arguments()
+page_size = args.per_page
+
+vcenters = args.vcenter or vcenter_hosts
+if not vcenters:
+    print("No vCenter servers to index: pass --vcenter or list them under vcenter.hosts in ~/.vcenter")
+    sys.exit(1)
+
+# Share one keep-alive connection pool between all workers
+session = requests.Session()
+session.auth = (username, password)
+session.verify = False  # Disable SSL certificate verification
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=args.workers))
+
+# Retrieve the ID and name of every host using the Satellite API
+hosts = list(get_hosts_by_domain('example.net'))
+
+# Reuse the results of hosts already collected within args.max_age
+checkpointed = load_checkpoint(args.checkpoint, args.max_age * 3600)
+hosts = [host for host in hosts if host['name'] not in checkpointed]
+print(f"Resuming with {len(checkpointed)} checkpointed hosts, {len(hosts)} hosts to collect")
+
+batches = [hosts[i:i + args.fact_batch] for i in range(0, len(hosts), args.fact_batch)]
+
+# Index the VMs of every vCenter up front
+vm_index = build_vm_indexes(vcenters)
+
+# Fetch facts for up to args.workers batches of hosts at a time, processing
+# each batch as soon as its facts arrive
+results = {
+    "ok": network_facts,
+    "no_facts": no_facts,
+    "no_net": no_net,
+    "no_dns": no_dns,
+    "skipped": skipped,
+}
+for entry in checkpointed.values():
+    results[entry["status"]].append(entry["record"] if entry["status"] == "ok" else entry["host"])
+
+os.makedirs(os.path.dirname(os.path.abspath(args.checkpoint)), exist_ok=True)
+with open(args.checkpoint, "a") as checkpoint, ThreadPoolExecutor(max_workers=args.workers) as executor:
+    batch_facts = executor.map(lambda batch: host_facts([host['name'] for host in batch]), batches)
+    for batch, facts in zip(batches, batch_facts):
+        for host in batch:
+            status, name, record = collect_host(host, facts.get(host['name']))
+            results[status].append(record if status == "ok" else name)
+            write_checkpoint(checkpoint, name, status, record)
+
+# Only create or update the subnets whose fields differ from Satellite
+desired = build_subnets(sort_dicts(network_facts))
+creates, updates, unchanged = diff_subnets(desired, get_subnets())
+
+print(f"Subnets: {len(creates)} to create, {len(updates)} to update, {unchanged} unchanged")
+for subnet in creates:
+    print(f"  create {subnet['network']}: {subnet['description']}")
+for subnet_id, subnet, changed in updates:
+    print(f"  update {subnet['network']} (id {subnet_id}): {', '.join(changed)}")
+
+if not args.dry_run:
+    with ThreadPoolExecutor(max_workers=args.write_workers) as executor:
+        futures = [executor.submit(create_subnet, subnet) for subnet in creates]
+        futures += [executor.submit(update_subnet, subnet_id, subnet) for subnet_id, subnet, _ in updates]
+        for future in futures:
+            future.result()
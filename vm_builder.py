@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import argparse
+import csv
 import ipaddress
 import sys
 import getpass
@@ -8,11 +9,22 @@ import os
 from ansible_runner import run
 import yaml
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def run_playbook(playbook_path, inventory_path, **kwargs):
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, 'plugins', 'filter'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'module_utils'))
+
+from filters import FilterModule
+from satellite_helper import SatelliteApi
+
+# Columns a batch manifest may set for each VM. Empty columns fall back to the command line options.
+MANIFEST_FIELDS = ['hostname', 'vmname', 'ip', 'subnet', 'memory', 'cores', 'storage']
+
+def run_playbook(playbook_path, inventory_path, log_file=None, private_data_dir=None, quiet=False, **kwargs):
     # Set the runner parameters
     runner_params = {
-                        'quiet': False,
+                        'quiet': quiet,
                         'verbosity': args.verbosity,
                         'envvars':
                         {
@@ -23,20 +35,28 @@ def run_playbook(playbook_path, inventory_path, **kwargs):
                         }, 
                     }
 
+    if private_data_dir:
+        # Each batch build keeps its runner artifacts in its own directory
+        runner_params['private_data_dir'] = private_data_dir
+
     playbook_path = os.path.abspath(playbook_path)
 
     # Run the playbook
     status = run(playbook=playbook_path, inventory=inventory_path, **runner_params)
 
     # Print the status of the playbook run
-    print(status)
+    if not quiet:
+        print(status)
     
-    with open(args.log_file, 'w') as file:
+    with open(log_file or args.log_file, 'w') as file:
         for x in status.events:
             file.write(json.dumps(x, indent=4))
-def create_playbook(args, capsule):
+    return status
+
+def create_playbook(args, capsule, build_dir=None):
     """
-    This function creates a dictionary of data to be used by the Jinja2 template
+    This function creates a dictionary of data to be used by the Jinja2 template.
+    When build_dir is set, the playbook, inventory, logs and runner artifacts are written there instead
     """
     data = {}
     data['vmname'] = args.hostname or args.vmname
@@ -69,7 +89,15 @@ def create_playbook(args, capsule):
         }
     ]
 
-    with open('runtime/playbooks/main.yaml', 'w') as f:
+    playbook_path = 'runtime/playbooks/main.yaml'
+    inventory_file = 'inv.json'
+    inventory_path = 'runtime/inventory/inv.json'
+    if build_dir:
+        os.makedirs(build_dir, exist_ok=True)
+        playbook_path = os.path.join(build_dir, 'main.yaml')
+        inventory_file = inventory_path = os.path.join(build_dir, 'inv.json')
+
+    with open(playbook_path, 'w') as f:
         yaml.dump(playbook, f, sort_keys=False)
 
     # Create inventory JSON file
@@ -89,10 +117,13 @@ def create_playbook(args, capsule):
             }
         }
     }
-    with open('inv.json', 'w') as file:
+    with open(inventory_file, 'w') as file:
         json.dump(inventory, file)
 
-    run_playbook('runtime/playbooks/main.yaml', 'runtime/inventory/inv.json')
+    if build_dir:
+        return run_playbook(playbook_path, inventory_path, log_file=os.path.join(build_dir, 'builder-logs.json'),
+                            private_data_dir=build_dir, quiet=True)
+    return run_playbook(playbook_path, inventory_path)
 
 
 def get_password(password_env_var):
@@ -105,6 +136,41 @@ def get_password(password_env_var):
         os.environ[password_env_var] = password
     return password
 
+def allocate_ips(args, subnet_address, count=1, reserved=()):
+    """
+    Returns the first count free IP addresses in a subnet. Reserved addresses and addresses claimed by Satellite hosts
+    are skipped, and with --check-vcenter so are the addresses reported by the guests of the subnet's vCenter
+    """
+    if not args.satellite_fqdn:
+        print("--satellite-fqdn is required to pick an IP address from --subnet.")
+        sys.exit(1)
+    if '/' not in subnet_address:
+        print(f"Subnet {subnet_address} is missing the netmask.")
+        sys.exit(1)
+
+    satellite = SatelliteApi(args.satellite_fqdn, args.satellite_username, get_password('SATELLITE_PASSWORD'))
+    subnet = satellite.get_subnet(subnet_address)
+    if not subnet:
+        print(f"There is no subnet {subnet_address} in satellite.")
+        sys.exit(1)
+    claimed = satellite.get_subnet_claims(subnet) + list(reserved)
+
+    if args.check_vcenter:
+        # pyVmomi is only needed when vCenter guests are checked as well
+        from vcenter_helper import VcenterFacts
+        vcenter = (subnet.get('description') or '').split(',')[0]
+        if not vcenter:
+            print(f"Subnet {subnet_address} has no vCenter in its description.")
+            sys.exit(1)
+        vcenter_facts = VcenterFacts(vcenter, args.vcenter_username, get_password('VCENTER_PASSWORD'))
+        claimed.extend(vcenter_facts.get_guest_ips())
+
+    ips = FilterModule().free_ips(subnet, claimed, count)
+    if len(ips) < count:
+        print(f"Subnet {subnet_address} only has {len(ips)} free IP addresses, {count} are needed.")
+        sys.exit(1)
+    return ips
+
 def validate_ip(ip_address):
     """
     This function returns True if the provided IP address is a valid IPv4 address and not a multicast address, otherwise False
@@ -136,45 +202,186 @@ def check_hostname_prefix(hostname):
         result = ' tempa'
     return result
 
+def validate_build(build):
+    """
+    This function returns the list of reasons the build settings are invalid, empty if they are valid
+    """
+    errors = []
+    if build.storage and build.storage > 10000:
+        errors.append("Storage size can't be greater than 10TB.")
+    if build.memory > 64:
+        errors.append("Memory size can't be greater than 64GB.")
+    if build.cores > 12:
+        errors.append("Number of CPU cores can't be greater than 12.")
+    if not validate_ip(build.ip):
+        errors.append(f"Invalid IP address: {build.ip}")
+    # The hostname names the per-VM directory under --artifact-dir, so it can't contain a path
+    if '/' in build.hostname or '..' in build.hostname:
+        errors.append(f"Invalid hostname: {build.hostname}")
+    elif not check_hostname_prefix(build.hostname):
+        errors.append(f"Invalid hostname: {build.hostname}")
+    elif build.ad_principal and build.hostname[3] != 'a':
+        errors.append(f"Invalid hostname: {build.hostname}. Make sure to use the correct principal.")
+    elif build.idm_principal and build.hostname[3] not in ['s', 'w']:
+        errors.append(f"Invalid hostname: {build.hostname}. Make sure to use the correct principal.")
+    return errors
+
+def get_build_passwords(args):
+    """
+    Sets every password the build playbook needs, prompting for the ones not in the environment
+    """
+    if args.ad_principal:
+        get_password('AD_PASSWORD')
+    if args.idm_principal:
+        get_password('IDM_PASSWORD')
+    get_password('VCENTER_PASSWORD')
+    get_password('SATELLITE_PASSWORD')
+
+def load_manifest(path):
+    """
+    This function reads a batch manifest and returns one dictionary per VM. A YAML manifest is a list of mappings,
+    a CSV manifest has a header line naming its columns
+    """
+    with open(path) as file:
+        if path.endswith(('.yml', '.yaml')):
+            rows = yaml.safe_load(file) or []
+        else:
+            rows = list(csv.DictReader(file))
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        print(f"Manifest {path} must be a list of VMs.")
+        sys.exit(1)
+    return rows
+
+def manifest_build(args, row):
+    """
+    This function returns the build settings for a manifest row, raising ValueError when the row can't be used.
+    Empty columns fall back to the command line options, except hostname, vmname and ip which are per VM
+    """
+    # csv.DictReader files cells past the header under None, such as the empty one of a trailing comma
+    extra = row.get(None)
+    if isinstance(extra, list):
+        if any(str(cell).strip() for cell in extra):
+            raise ValueError(f"Row has more cells than the header has columns: {', '.join(map(str, extra))}")
+        row = {column: value for column, value in row.items() if column is not None}
+    unknown = set(row) - set(MANIFEST_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(str(column) for column in unknown))}")
+
+    build = argparse.Namespace(**vars(args))
+    build.hostname = build.vmname = build.ip = None
+    for field in MANIFEST_FIELDS:
+        value = row.get(field)
+        if value is None or value == '':
+            continue
+        if field in ['memory', 'cores', 'storage']:
+            # YAML hands over floats and booleans, which int() would silently truncate
+            if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+                raise ValueError(f"{field} must be a whole number, not {value}")
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be a whole number, not {value}")
+        else:
+            value = str(value).strip()
+        setattr(build, field, value)
+
+    if not build.hostname:
+        raise ValueError("hostname is required")
+    if build.memory is None or build.cores is None:
+        raise ValueError("memory and cores are required, in the manifest or with --memory and --cores")
+    if not build.ip and not build.subnet:
+        raise ValueError("ip is required, unless a subnet is set in the manifest or with --subnet")
+    return build
+
+def run_batch(args):
+    """
+    This function builds every VM in the --manifest file. All rows are validated before the first build starts,
+    then up to --max-parallel playbooks run at once, each one in its own directory under --artifact-dir
+    """
+    builds = []
+    errors = []
+    for number, row in enumerate(load_manifest(args.manifest), 1):
+        try:
+            builds.append((number, manifest_build(args, row)))
+        except ValueError as e:
+            errors.append(f"Row {number}: {e}")
+    if not builds and not errors:
+        errors.append(f"Manifest {args.manifest} has no VMs.")
+    if errors:
+        for error in errors:
+            print(error)
+        sys.exit(1)
+
+    # Rows without an ip get the next free addresses of their subnet, one Satellite lookup per subnet
+    listed = [build.ip for _, build in builds if build.ip]
+    by_subnet = {}
+    for _, build in builds:
+        if not build.ip:
+            by_subnet.setdefault(build.subnet, []).append(build)
+    for subnet, subnet_builds in by_subnet.items():
+        for build, ip in zip(subnet_builds, allocate_ips(args, subnet, len(subnet_builds), listed)):
+            build.ip = ip
+
+    used = {}
+    for number, build in builds:
+        errors.extend(f"Row {number}: {error}" for error in validate_build(build))
+        for field, value in [('hostname', build.hostname), ('IP address', build.ip)]:
+            if (field, value) in used:
+                errors.append(f"Row {number}: {field} {value} is already used by row {used[(field, value)]}")
+            else:
+                used[(field, value)] = number
+    if errors:
+        for error in errors:
+            print(error)
+        sys.exit(1)
+
+    get_build_passwords(args)
+    for _, build in builds:
+        print(f"Hostname: {build.hostname}  VM name: {build.hostname or build.vmname}  IP address: {build.ip}")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.max_parallel) as executor:
+        futures = {
+            executor.submit(create_playbook, build, 'localhost', os.path.join(args.artifact_dir, build.hostname)): build
+            for _, build in builds
+        }
+        for future in as_completed(futures):
+            build = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                print(f"{build.hostname}: failed to run the playbook: {e}")
+                failed += 1
+                continue
+            print(f"{build.hostname}: {status.status} (rc {status.rc})")
+            if status.rc != 0:
+                failed += 1
+
+    if failed:
+        print(f"{failed} of {len(builds)} builds failed. See {args.artifact_dir} for the logs.")
+        sys.exit(1)
+
 def main(args):
     # Your command line tool logic here
     try:
-        vmname = args.hostname or args.vmname
-        hostname = args.hostname
-        ip_valid = validate_ip(args.ip)
-        if args.storage and args.storage > 10000:
-            print("Storage size can't be greater than 10TB.")
-            sys.exit(1)
-        if args.memory > 64:
-            print("Memory size can't be greater than 64GB.")
-            sys.exit(1)
-        if args.cores > 12:
-            print("Number of CPU cores can't be greater than 12.")
-            sys.exit(1)
-        if not ip_valid:
-            print(f"Invalid IP address: {args.ip}")
-            sys.exit(1)
-        if not check_hostname_prefix(args.hostname):
-            print(f"Invalid hostname: {args.hostname}")
-            sys.exit(1)
+        if args.manifest:
+            run_batch(args)
+            return
 
-        if args.ad_principal:
-            if hostname[3] == 'a':
-                ad_password = get_password('AD_PASSWORD')
-            else:
-                print(f"Invalid hostname: {args.hostname}. Make sure to use the correct principal.")
+        vmname = args.hostname or args.vmname
+        if not args.ip:
+            if not args.subnet:
+                print("Either --ip or --subnet is required.")
                 sys.exit(1)
+            args.ip = allocate_ips(args, args.subnet)[0]
+        errors = validate_build(args)
+        if errors:
+            for error in errors:
+                print(error)
+            sys.exit(1)
 
-        if args.idm_principal:
-            if hostname[3] in ['s', 'w']:
-                idm_password = get_password('IDM_PASSWORD')
-            else:
-                print(f"Invalid hostname: {args.hostname}. Make sure to use the correct principal.")
-                sys.exit(1)
+        get_build_passwords(args)
 
-        vcenter_password = get_password('VCENTER_PASSWORD')
-        satellite_password = get_password('SATELLITE_PASSWORD')
-        
         print(f"Hostname: {args.hostname}")
         print(f"VM name: {vmname}")
         print(f"IP address: {args.ip}")
@@ -184,11 +391,14 @@ def main(args):
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Command line tool to help launch the VM build playbook. Also, you can chose to set the following environment variables: VCENTER_PASSWORD, SATELLITE_PASSWORD, AD_PASSWORD, IDM_PASSWORD. If you do, you won't be prompted for the password.")
-    parser.add_argument('--ip', required=True, help="IP address for the VM: --ip 192.168.1.2")
-    parser.add_argument('--hostname', required=True, help="Name of the hostname: --hostname tempw01.example.com")
+    parser.add_argument('--ip', help="IP address for the VM: --ip 192.168.1.2")
+    parser.add_argument('--subnet', help="Subnet to pick the first free IP address from when --ip is not set: --subnet 192.168.1.0/24")
+    parser.add_argument('--satellite-fqdn', help="Satellite server used to find the free IP addresses of --subnet: --satellite-fqdn satellite.example.com")
+    parser.add_argument('--check-vcenter', action='store_true', help="Also skip the IP addresses reported by the vCenter guests when picking from --subnet")
+    parser.add_argument('--hostname', help="Name of the hostname: --hostname tempw01.example.com")
     parser.add_argument('--vmname', help="Name of the VM (defaults to hostname): --vmname myvm")
-    parser.add_argument('--memory', required=True, type=int, help="Memory size in GB (max 64GB): --memory 64")
-    parser.add_argument('--cores', required=True, type=int, help="Number of CPU cores (max 12 cores): --cores 10")
+    parser.add_argument('--memory', type=int, help="Memory size in GB (max 64GB): --memory 64")
+    parser.add_argument('--cores', type=int, help="Number of CPU cores (max 12 cores): --cores 10")
     parser.add_argument('--storage',type=int, help="This will be used to create a vm with the datastore with the most available space (max 10000 GB): --storage 10000")
     parser.add_argument('--log-file', default='/tmp/builder-logs.json',help="Output file for the playbook run: --output-file /tmp/output.txt")
     parser.add_argument('--verbosity', type=int, default=0, help="Verbosity level of the playbook run: --verbosity 0 (default) is normal, --verbosity 1 is verbose, --verbosity 2 is more verbose, --verbosity 3 is debug, --verbosity 4 is connection debug, --verbosity 5 is winrm debug.")
@@ -197,7 +407,17 @@ def parse_arguments():
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('--ad-principal', help="Use AD for authentication: --ad-principal admin")
     group.add_argument('--idm-principal',help="Use IDM for authentication: --idm-principal admin")
-    return parser.parse_args()
+    parser.add_argument('--manifest', help="CSV or YAML file listing several VMs to build, with the columns hostname, vmname, ip, subnet, memory, cores and storage. Empty columns default to the matching option: --manifest wave1.csv")
+    parser.add_argument('--max-parallel', type=int, default=4, help="Number of playbooks run at once in --manifest mode: --max-parallel 4")
+    parser.add_argument('--artifact-dir', default='/tmp/builder-runs', help="Directory holding one sub-directory of logs and runner artifacts per VM in --manifest mode: --artifact-dir /tmp/builder-runs")
+    args = parser.parse_args()
+    if args.max_parallel < 1:
+        parser.error("--max-parallel must be at least 1")
+    if not args.manifest:
+        missing = [option for option in ['hostname', 'memory', 'cores'] if getattr(args, option) is None]
+        if missing:
+            parser.error(f"the following arguments are required: {', '.join('--' + option for option in missing)}")
+    return args
 
 if __name__ == "__main__":
     args = parse_arguments()